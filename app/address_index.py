@@ -0,0 +1,76 @@
+import threading
+
+from solders.pubkey import Pubkey
+
+from .logging import logger
+from .models import Accounts, db
+
+
+def address_key(address) -> bytes:
+    """Return raw 32-byte key of base58 address string or Pubkey"""
+    if isinstance(address, str):
+        address = Pubkey.from_string(address)
+    return bytes(address)
+
+
+class AddressIndex:
+    """Process-wide set of our account addresses kept as raw 32-byte keys.
+
+    Accounts rows are loaded once and then picked up incrementally by id watermark,
+    wallets created in this process are added directly."""
+    keys = set()
+    snapshot = None   # frozenset copy of keys returned by get_keys, None after a change
+    watermark = 0
+    lock = threading.Lock()
+
+    @classmethod
+    def refresh(cls):
+        """Load Accounts rows created since the last refresh"""
+        tries = 3
+        with cls.lock:
+            for i in range(tries):
+                try:
+                    rows = (db.session.query(Accounts.id, Accounts.address)
+                                      .filter(Accounts.id > cls.watermark)
+                                      .order_by(Accounts.id)
+                                      .all())
+                except Exception:
+                    if i < tries - 1: # i is zero indexed
+                        db.session.rollback()
+                        continue
+                    else:
+                        db.session.rollback()
+                        raise Exception("There was exception during query to the database, try again later")
+                break
+            for row in rows:
+                try:
+                    cls.keys.add(address_key(row.address))
+                except ValueError:
+                    logger.warning(f"Skip invalid address {row.address} in accounts")
+            if rows:
+                cls.watermark = rows[-1].id
+                cls.snapshot = None
+
+    @classmethod
+    def add(cls, address):
+        key = address_key(address)
+        with cls.lock:
+            cls.keys.add(key)
+            cls.snapshot = None
+
+    @classmethod
+    def contains(cls, address) -> bool:
+        """Check base58 address string or Pubkey, does not refresh the index"""
+        try:
+            return address_key(address) in cls.keys
+        except (ValueError, TypeError):
+            return False
+
+    @classmethod
+    def get_keys(cls) -> frozenset:
+        """Return up to date snapshot of our raw keys, callers may iterate it while addresses are added"""
+        cls.refresh()
+        with cls.lock:
+            if cls.snapshot is None:
+                cls.snapshot = frozenset(cls.keys)
+            return cls.snapshot
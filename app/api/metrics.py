@@ -7,6 +7,8 @@ from . import metrics_blueprint
 from ..config import config
 from ..models import Settings, db
 from ..coin import Coin
+from ..logging import logger
+from .. import balances, cache, drains, keypairs, outbox, rpc_pool
 
 
 prometheus_client.REGISTRY.unregister(prometheus_client.GC_COLLECTOR)
@@ -34,7 +36,7 @@ def get_all_metrics():
         last_fullnode_block_number = int(last_slot)
         response['last_fullnode_block_number'] = last_fullnode_block_number
         response['last_fullnode_block_timestamp'] = inst.get_block_time(last_slot)
-        solana_version = inst.client.get_version().value.solana_core
+        solana_version = inst.get_version()
         response['solana_version'] = solana_version
         pd = Settings.query.filter_by(name = 'last_block').first()
         last_checked_block_number = int(pd.value)
@@ -58,10 +60,64 @@ solana_fullnode_last_block = Gauge('solana_fullnode_last_block', 'Last block loa
 solana_wallet_last_block = Gauge('solana_wallet_last_block', 'Last checked block ') 
 solana_fullnode_last_block_timestamp = Gauge('solana_fullnode_last_block_timestamp', 'Last block timestamp loaded to the fullnode', )
 solana_wallet_last_block_timestamp = Gauge('solana_wallet_last_block_timestamp', 'Last checked block timestamp')
+solana_drains = Gauge('solana_drains', 'Drain triggers by result: scheduled, coalesced into a pending drain or executed', ['result'])
+solana_notifications_queue_depth = Gauge('solana_notifications_queue_depth', 'SHKeeper notifications waiting for delivery')
+solana_rpc_requests = Gauge('solana_rpc_requests', 'HTTP requests sent to the fullnode by the pooled clients')
+solana_rpc_connections = Gauge('solana_rpc_connections', 'New connections opened to the fullnode by the pooled clients')
+solana_cache_hits = Gauge('solana_cache_hits', 'Lookups answered from the TTL cache', ['key'])
+solana_cache_misses = Gauge('solana_cache_misses', 'Lookups loaded from the fullnode because of a missing or expired entry', ['key'])
+solana_keypair_cache_hits = Gauge('solana_keypair_cache_hits', 'Signers taken from the keypair cache')
+solana_keypair_cache_misses = Gauge('solana_keypair_cache_misses', 'Signers loaded from the database and decrypted')
+solana_keypair_cache_evictions = Gauge('solana_keypair_cache_evictions', 'Keypairs removed from the cache: size, expired or explicit', ['reason'])
+solana_dirty_balances = Gauge('solana_dirty_balances', 'Account balances changed by transactions and waiting for refresh')
+
+
+def set_queue_depth():
+    try:
+        solana_notifications_queue_depth.set(outbox.get_queue_depth())
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def set_dirty_balances():
+    solana_dirty_balances.set(balances.get_dirty_size())
+
+
+def set_rpc_counters():
+    rpc_counters = rpc_pool.counters.get()
+    solana_rpc_requests.set(rpc_counters.get("requests", 0))
+    solana_rpc_connections.set(rpc_counters.get("connections", 0))
+
+
+def set_cache_counters():
+    for name, value in cache.counters.get().items():
+        result, key = name.split(":", 1)
+        (solana_cache_hits if result == "hits" else solana_cache_misses).labels(key).set(value)
+
+
+def set_keypair_cache_counters():
+    keypair_counters = keypairs.counters.get()
+    solana_keypair_cache_hits.set(keypair_counters.get("hits", 0))
+    solana_keypair_cache_misses.set(keypair_counters.get("misses", 0))
+    for reason in ("size", "expired", "explicit"):
+        solana_keypair_cache_evictions.labels(reason).set(keypair_counters.get(f"evictions:{reason}", 0))
+
+
+def set_drain_counters():
+    for result, value in drains.get_counters().items():
+        solana_drains.labels(result).set(value)
 
 
 @metrics_blueprint.get("/metrics")
 def get_metrics():
+    # Redis or the database being down leaves only their gauges stale
+    for set_gauges in (set_queue_depth, set_dirty_balances, set_rpc_counters, set_cache_counters,
+                       set_keypair_cache_counters, set_drain_counters):
+        try:
+            set_gauges()
+        except Exception as e:
+            logger.warning(f"Cannot update metrics in {set_gauges.__name__}: {e}")
     response = get_all_metrics()
     if response['solana_fullnode_status'] == 1:
         solana_fullnode_version.info({'version': response['solana_version']})
@@ -0,0 +1,132 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import httpx
+from solana.rpc.async_api import AsyncClient
+from solders.rpc.requests import GetBlock
+from solders.rpc.responses import GetBlockResp
+
+from .config import config
+from .logging import logger
+from .coin import Coin
+from .address_index import AddressIndex
+from .backfill import catch_up
+from .block_cache import get_block_cache
+from .rpc_limiter import AsyncLimitedTransport
+from .rpc_pool import get_limiter
+from . import scanner_metrics
+from .events import Checkpoint, check_block, get_token_symbols, save_last_block
+
+
+def get_async_client(concurrency) -> AsyncClient:
+    """Return AsyncClient with a connection pool large enough for concurrency requests,
+    its requests share the adaptive limit with the pooled client of the process"""
+    client = AsyncClient(config['FULLNODE_URL'], timeout=float(config['FULLNODE_TIMEOUT']))
+    transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(max_connections=concurrency,
+                                                             max_keepalive_connections=concurrency))
+    limiter = get_limiter()
+    if limiter is not None:
+        transport = AsyncLimitedTransport(transport, limiter)
+    client._provider.session = httpx.AsyncClient(timeout=float(config['FULLNODE_TIMEOUT']), transport=transport)
+    return client
+
+
+async def scan_blocks_async(blocks, fetch, process, concurrency, on_checkpoint):
+    """Fetch and process every block with up to concurrency blocks in work at once.
+    on_checkpoint(block) is called when the contiguous prefix of finished blocks grows."""
+    semaphore = asyncio.Semaphore(concurrency)
+    checkpoint = Checkpoint(blocks, on_checkpoint, concurrency)
+
+    async def run(index):
+        async with semaphore:
+            start_time = time.time()
+            buf = await fetch(blocks[index])
+            await process(blocks[index], buf)
+            scanner_metrics.block_seconds.observe(time.time() - start_time)
+        return index
+
+    tasks = [asyncio.create_task(run(index)) for index in range(len(blocks))]
+    try:
+        for task in asyncio.as_completed(tasks):
+            checkpoint.done(await task)
+    except Exception as e:
+        logger.warning(f"Block scan failed: {e}")
+        scanner_metrics.block_failures.inc()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    finally:
+        checkpoint.flush()
+
+
+async def _async_log_loop(last_checked_block, check_interval):
+    concurrency = int(config['EVENTS_ASYNC_CONCURRENCY'])
+    client = get_async_client(concurrency)
+    coin = Coin("SOL")
+    token_symbols = get_token_symbols()
+    loop = asyncio.get_running_loop()
+    # matching and notifications are blocking, they run next to the event loop
+    executor = ThreadPoolExecutor(max_workers=int(config['EVENTS_MAX_THREADS_NUMBER']))
+
+    cache = get_block_cache()
+    mode = coin.get_block_mode()
+
+    async def fetch(block):
+        if cache:
+            data = cache.get(block, mode)
+            if data is not None:
+                return data
+        body = GetBlock(int(block), coin.get_block_config())
+        data = (await client._provider.make_request(body, GetBlockResp)).value
+        if cache and data is not None:
+            await loop.run_in_executor(executor, cache.put, block, mode, data)
+        return data
+
+    try:
+        while True:
+            last_block = int((await client.get_slot()).value)
+            backfilled_block = catch_up(coin, last_checked_block, last_block, token_symbols)
+            if backfilled_block is not None:
+                last_checked_block = backfilled_block
+                continue
+            # avoid too big block range
+            if last_block - int(last_checked_block) > 10000:
+                last_block = int(last_checked_block) + 10000
+            if int(last_checked_block) > last_block:
+                logger.exception(f'Last checked block {last_checked_block} is bigger than last block {last_block} in blockchain')
+                await asyncio.sleep(check_interval)
+                continue
+            blocks_list = (await client.get_blocks(int(last_checked_block), last_block)).value
+            our_keys = AddressIndex.get_keys()
+            # the threads mode in events.py starts at the same size of blocks_list
+            if len(blocks_list) <= int(config['EVENTS_MIN_DIFF_TO_RUN_PARALLEL']):
+                logger.warning("Waiting for a new slots")
+                await asyncio.sleep(check_interval)
+                continue
+            # blocks_list starts with the already checked block
+            blocks = [block for block in blocks_list if int(block) > int(last_checked_block)]
+
+            async def process(block, buf):
+                await loop.run_in_executor(executor, check_block, coin, block, buf, our_keys, token_symbols)
+
+            def save_checkpoint(block):
+                nonlocal last_checked_block
+                last_checked_block = block
+                save_last_block(block)
+
+            start_time = time.time()
+            logger.warning(f'Working on {blocks[0]} - {blocks[-1]}')
+            await scan_blocks_async(blocks, fetch, process, concurrency, save_checkpoint)
+            scanner_metrics.chunk_seconds.observe(time.time() - start_time)
+            scanner_metrics.chunk_blocks.observe(len(blocks))
+            logger.warning(f'Blocks {blocks[0]} - {blocks[-1]} processed for {time.time() - start_time} seconds')
+    finally:
+        executor.shutdown(wait=False)
+        await client.close()
+
+
+def async_log_loop(last_checked_block, check_interval):
+    """Block scanner running getBlock requests concurrently on one event loop"""
+    asyncio.run(_async_log_loop(last_checked_block, check_interval))
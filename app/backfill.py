@@ -0,0 +1,92 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+from .config import config
+from .logging import logger
+from .address_index import AddressIndex
+from .events import handle_transaction, match_transaction, save_last_block
+from .ws_events import get_token_programs, get_watched_pubkeys
+
+
+SIGNATURES_PAGE_SIZE = 1000 # max limit of getSignaturesForAddress
+RETRY_AFTER_FAILURE_SECONDS = 3600
+failed_at = 0
+
+
+def should_backfill(coin, last_checked_block, last_block, watched_count) -> bool:
+    """Compare the cost of downloading every block of the gap with the cost of
+    querying signatures of every watched account, both in getSignaturesForAddress requests"""
+    if config['EVENTS_BACKFILL_MODE'] != 'auto':
+        return False
+    gap = int(last_block) - int(last_checked_block)
+    if gap < int(config['EVENTS_BACKFILL_MIN_SLOTS']):
+        return False
+    if gap * int(config['EVENTS_BACKFILL_BLOCK_COST']) <= watched_count:
+        return False
+    # the node must keep the history of the whole gap or signatures are silently missing
+    first_available = coin.client.get_first_available_block().value
+    if int(first_available) > int(last_checked_block):
+        logger.warning(f"Fullnode history starts at {first_available}, cannot backfill from {last_checked_block}")
+        return False
+    return True
+
+
+def get_signatures(coin, pubkey, last_checked_block, target_block) -> list:
+    """Return signatures of the account in (last_checked_block, target_block] slots, newest first"""
+    signatures = []
+    before = None
+    while True:
+        page = coin.client.get_signatures_for_address(pubkey, before=before, limit=SIGNATURES_PAGE_SIZE).value
+        for status in page:
+            if status.slot <= int(last_checked_block):
+                return signatures
+            if status.slot <= int(target_block):
+                signatures.append(status.signature)
+        if len(page) < SIGNATURES_PAGE_SIZE:
+            return signatures
+        before = page[-1].signature
+
+
+def check_signature(coin, signature, our_keys, token_symbols):
+    transaction = coin.get_transaction(signature)
+    if transaction is None:
+        raise Exception(f"Cannot get transaction {signature}")
+    symbols, drains, touched = match_transaction(transaction.transaction, our_keys, token_symbols)
+    if symbols:
+        logger.warning(f"Found related transaction {signature} in account history: {sorted(symbols)}")
+        handle_transaction(coin, str(signature), symbols, drains, touched)
+
+
+def backfill(coin, last_checked_block, target_block, our_keys, token_symbols, pubkeys):
+    """Handle our transactions in (last_checked_block, target_block] from account histories
+    and move last_block to target_block, the block scanner continues from there"""
+    start_time = time.time()
+    logger.warning(f"Backfilling {last_checked_block} - {target_block} from history of {len(pubkeys)} accounts")
+    with ThreadPoolExecutor(max_workers=int(config['EVENTS_MAX_THREADS_NUMBER'])) as executor:
+        pages = executor.map(lambda pubkey: get_signatures(coin, pubkey, last_checked_block, target_block), pubkeys)
+        # a transaction touching several of our accounts is checked once
+        signatures = list(dict.fromkeys(signature for page in pages for signature in page))
+        list(executor.map(lambda signature: check_signature(coin, signature, our_keys, token_symbols), signatures))
+    save_last_block(target_block)
+    logger.warning(f"Backfilled {last_checked_block} - {target_block} with {len(signatures)} transactions "
+                   f"for {time.time() - start_time} seconds")
+
+
+def catch_up(coin, last_checked_block, last_block, token_symbols):
+    """Backfill the gap up to last_block if it is cheaper than the block scan,
+    return the new last checked block or None if the blocks should be scanned"""
+    global failed_at
+    if time.time() - failed_at < RETRY_AFTER_FAILURE_SECONDS:
+        return None
+    our_keys = AddressIndex.get_keys()
+    tokens_count = len(config['TOKENS'][config["CURRENT_SOL_NETWORK"]])
+    if not should_backfill(coin, last_checked_block, last_block, len(our_keys) * (1 + tokens_count)):
+        return None
+    try:
+        backfill(coin, last_checked_block, last_block, our_keys, token_symbols,
+                 get_watched_pubkeys(our_keys, get_token_programs()))
+    except Exception as e:
+        failed_at = time.time()
+        logger.warning(f"Backfill failed: {e}, scanning blocks instead")
+        return None
+    return int(last_block)
@@ -0,0 +1,29 @@
+import redis
+
+from .config import config
+from .logging import logger
+
+
+redis_client = redis.Redis(host=config['REDIS_HOST'])
+DIRTY_KEY = "solana:balances:dirty"
+
+
+def mark_dirty(pairs):
+    """Remember (symbol, address) pairs touched by a transaction, refresh_dirty_balances
+    updates their cached amounts. If Redis is down the full refresh picks them up."""
+    if not pairs:
+        return
+    try:
+        redis_client.sadd(DIRTY_KEY, *[f"{symbol}:{address}" for symbol, address in pairs])
+    except Exception as e:
+        logger.warning(f"Cannot mark balances of {sorted(pairs)} as changed: {e}")
+
+
+def pop_dirty(count) -> list:
+    """Take up to count (symbol, address) pairs out of the dirty set"""
+    members = redis_client.spop(DIRTY_KEY, count) or []
+    return [tuple(member.decode().split(':', 1)) for member in members]
+
+
+def get_dirty_size() -> int:
+    return redis_client.scard(DIRTY_KEY)
@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from solders.transaction_status import UiConfirmedBlock
+
+from .config import config
+from .logging import logger
+
+
+class BlockCache:
+    """Size bounded store of compressed blocks in a local SQLite file.
+
+    Blocks are keyed by slot and the getBlock mode they were downloaded with,
+    the least recently used ones are evicted when the file grows over max_bytes."""
+
+    def __init__(self, path, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS blocks (
+                                 slot INTEGER NOT NULL,
+                                 mode TEXT NOT NULL,
+                                 data BLOB NOT NULL,
+                                 size INTEGER NOT NULL,
+                                 accessed REAL NOT NULL,
+                                 PRIMARY KEY (slot, mode))""")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_blocks_accessed ON blocks (accessed)")
+        self.size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blocks").fetchone()[0]
+
+    def get(self, slot, mode):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM blocks WHERE slot = ? AND mode = ?", (int(slot), mode)).fetchone()
+            if row is None:
+                return None
+            self.conn.execute("UPDATE blocks SET accessed = ? WHERE slot = ? AND mode = ?", (time.time(), int(slot), mode))
+        return UiConfirmedBlock.from_json(zlib.decompress(row[0]).decode())
+
+    def put(self, slot, mode, block):
+        data = zlib.compress(block.to_json().encode(), int(config['BLOCK_CACHE_COMPRESSION_LEVEL']))
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM blocks WHERE slot = ? AND mode = ?", (int(slot), mode)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO blocks (slot, mode, data, size, accessed) VALUES (?, ?, ?, ?, ?)",
+                              (int(slot), mode, data, len(data), time.time()))
+            self.size += len(data) - (old[0] if old else 0)
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Remove the least recently used blocks down to 90% of max_bytes"""
+        target = self.max_bytes * 0.9
+        removed = []
+        for slot, mode, size in self.conn.execute("SELECT slot, mode, size FROM blocks ORDER BY accessed"):
+            if self.size <= target:
+                break
+            removed.append((slot, mode))
+            self.size -= size
+        self.conn.executemany("DELETE FROM blocks WHERE slot = ? AND mode = ?", removed)
+
+
+block_cache = None
+block_cache_lock = threading.Lock()
+
+
+def get_block_cache():
+    """Return the process-wide block cache, or None if BLOCK_CACHE_DIR is not set"""
+    global block_cache
+    if not config['BLOCK_CACHE_DIR']:
+        return None
+    with block_cache_lock:
+        if block_cache is None:
+            os.makedirs(config['BLOCK_CACHE_DIR'], exist_ok=True)
+            path = os.path.join(config['BLOCK_CACHE_DIR'], f"blocks-{config['CURRENT_SOL_NETWORK']}.sqlite")
+            block_cache = BlockCache(path, int(config['BLOCK_CACHE_MAX_BYTES']))
+            logger.warning(f"Using block cache {path}")
+    return block_cache
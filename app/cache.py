@@ -0,0 +1,40 @@
+import threading
+import time
+
+from .counters import RedisCounters
+
+
+# hits:<key> and misses:<key> of all processes, most lookups run in celery workers
+counters = RedisCounters("solana:cache:counters")
+
+
+class TTLCache:
+    """Thread-safe cache of values with a time to live per key, ttl=None keeps a value forever.
+
+    The loader runs outside of the lock, concurrent misses of the same key may load it twice."""
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, key, ttl, loader):
+        """Return cached value of key or store and return loader() result"""
+        name = key[0] if isinstance(key, tuple) else key
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and (entry[1] is None or entry[1] > now):
+            counters.inc(f"hits:{name}")
+            return entry[0]
+        counters.inc(f"misses:{name}")
+        value = loader()
+        with self.lock:
+            self.entries[key] = (value, None if ttl is None else now + ttl)
+        return value
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+rpc_cache = TTLCache()
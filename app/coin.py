@@ -1,4 +1,5 @@
 from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app as app
 import requests as rq
 import time
@@ -7,15 +8,18 @@ import copy
 import math
 
 import solders.rpc.errors
-from solana.rpc.api import Client
 from solders.keypair import Keypair
 from solders.pubkey import Pubkey
 from spl.token.client import Token
 from solders.hash import Hash
 from solders.message import MessageV0
-from spl.token.constants import TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID
-from solana.rpc.types import TokenAccountOpts
-from solders.system_program import TransferParams, transfer
+from spl.token.constants import TOKEN_PROGRAM_ID
+from solana.rpc.types import TokenAccountOpts, DataSliceOpts
+from solders.rpc.config import RpcBlockConfig
+from solders.rpc.requests import GetBlock
+from solders.rpc.responses import GetBlockResp
+from solders.transaction_status import UiTransactionEncoding, TransactionDetails
+from solders.system_program import TransferParams, transfer, ID as SYS_PROGRAM_ID
 from spl.token.instructions import transfer as spl_token_transfer 
 from spl.token.instructions import transfer_checked as pyusd_token_transfer
 from spl.token.instructions import TransferParams as spl_token_TransferParams
@@ -27,8 +31,16 @@ from .crypto import Crypto
 from .pyusd_transfer_params import PYUSDTransferParams
 from .logging import logger
 from .encryption import Encryption
-from .config import config,  get_token_address
+from .keypairs import KeypairCache
+from .config import config
 from .models import Accounts, Wallets, db
+from .rpc_batch import make_batch_request
+from .address_index import AddressIndex
+from .block_cache import get_block_cache
+from .rpc_pool import get_client
+from .cache import rpc_cache
+from .tokens import TokenRegistry
+from .token_accounts import AssociatedTokenAccounts
 
 
 
@@ -71,16 +83,13 @@ class Coin (Crypto):
             raise Exception("Symbol is not accepted")
         self.symbol = symbol        
         self.fullnode = config["FULLNODE_URL"]
-        self.client = Client(config['FULLNODE_URL'], timeout = float(config['FULLNODE_TIMEOUT']))
-        if symbol in config["TOKENS"][config["CURRENT_SOL_NETWORK"]]:
-            self.token_address = config["TOKENS"][config["CURRENT_SOL_NETWORK"]][symbol]["token_address"]
-        # PYUSD needs mint address, decimals and TOKEN_2022_PROGRAM_ID instead of TOKEN_PROGRAM_ID 
-        if symbol == "SOLANA-PYUSD":
-            self.mint = Pubkey.from_string(config["TOKENS"][config["CURRENT_SOL_NETWORK"]]["SOLANA-PYUSD"]["token_address"])
-            #self.decimals = int(config["TOKENS"][config["CURRENT_SOL_NETWORK"]]["SOLANA-PYUSD"]["decimals"])
-            self.token_program_id = TOKEN_2022_PROGRAM_ID
-        else:
-            self.token_program_id = TOKEN_PROGRAM_ID
+        self.client = get_client()
+        self.token_program_id = TOKEN_PROGRAM_ID
+        if symbol != "SOL":
+            self.token = TokenRegistry.get(symbol)
+            self.token_address = self.token.mint_address
+            self.mint = self.token.mint
+            self.token_program_id = self.token.program_id
 
     def is_connected(self):
          return self.client.is_connected()
@@ -92,15 +101,61 @@ class Coin (Crypto):
         self.client.get_account_info_json_parsed(pub_key).value
 
     def get_latest_blockhash(self):
-        return self.client.get_latest_blockhash().value
+        return rpc_cache.get('blockhash', float(config['CACHE_BLOCKHASH_SECONDS']),
+                             lambda: self.client.get_latest_blockhash().value)
+
+    def get_version(self) -> str:
+        return rpc_cache.get('version', float(config['CACHE_VERSION_SECONDS']),
+                             lambda: self.client.get_version().value.solana_core)
 
     def get_slot(self):
         return int(self.client.get_slot().value)
 
-    def get_block(self, slot, encoding='json', max_supported_transaction_version=0 ):
-        data = self.client.get_block(int(slot), encoding, max_supported_transaction_version).value
+    def get_block_config(self, max_supported_transaction_version=0) -> RpcBlockConfig:
+        """Return getBlock config of EVENTS_BLOCK_DETAILS mode, slim blocks carry only signatures, 
+        account keys and balances of transactions which is all the scanner reads"""
+        if config['EVENTS_BLOCK_DETAILS'] == 'accounts':
+            return RpcBlockConfig(encoding=UiTransactionEncoding.Json, 
+                                  transaction_details=TransactionDetails.Accounts,
+                                  rewards=False,
+                                  max_supported_transaction_version=max_supported_transaction_version)
+        return RpcBlockConfig(encoding=UiTransactionEncoding.Json, 
+                              max_supported_transaction_version=max_supported_transaction_version)
+
+    def get_block_mode(self, max_supported_transaction_version=0) -> str:
+        """Return block cache key of the getBlock config"""
+        return f"{config['EVENTS_BLOCK_DETAILS']}-v{max_supported_transaction_version}"
+
+    def get_block(self, slot, max_supported_transaction_version=0):
+        cache = get_block_cache()
+        if cache:
+            mode = self.get_block_mode(max_supported_transaction_version)
+            data = cache.get(slot, mode)
+            if data is not None:
+                return data
+        body = GetBlock(int(slot), self.get_block_config(max_supported_transaction_version))
+        data = self.client._provider.make_request(body, GetBlockResp).value
+        if cache and data is not None:
+            cache.put(slot, mode, data)
         return data
 
+    def get_blocks_batch(self, slots, max_supported_transaction_version=0) -> list:
+        """Return blocks fetched with JSON-RPC batch requests, a failed slot gets an exception instead of a block"""
+        cache = get_block_cache()
+        mode = self.get_block_mode(max_supported_transaction_version)
+        blocks = [cache.get(slot, mode) if cache else None for slot in slots]
+        missing = [i for i, block in enumerate(blocks) if block is None]
+        if not missing:
+            return blocks
+        block_config = self.get_block_config(max_supported_transaction_version)
+        bodies = [GetBlock(int(slots[i]), block_config, id=i) for i in missing]
+        responses = make_batch_request(self.client, bodies, [GetBlockResp] * len(bodies))
+        for i, resp in zip(missing, responses):
+            blocks[i] = resp if isinstance(resp, Exception) else resp.value
+            if cache and not isinstance(resp, Exception) and resp.value is not None:
+                cache.put(slots[i], mode, resp.value)
+        return blocks
+
     def get_blocks(self, start_slot, end_slot):
         data = self.client.get_blocks(int(start_slot), int(end_slot))
         if not isinstance(data, solders.rpc.errors.InvalidParamsMessage):
@@ -120,38 +175,46 @@ class Coin (Crypto):
             tx_sig = Signature.from_string(tx_sig)
         return self.client.get_transaction(tx_sig, encoding, commitment, max_supported_transaction_version).value
 
+    def get_confirmed_transaction(self, tx_sig):
+        """Return finalized transaction or the confirmed one, websocket notifications come before finalization"""
+        transaction = self.get_transaction(tx_sig)
+        if transaction is None:
+            transaction = self.get_transaction(tx_sig, commitment=config['EVENTS_WS_COMMITMENT'])
+        return transaction
+
     def get_multiple_accounts(self, pubkeys, commitment=None, encoding='base64', data_slice=None):
         return self.client.get_multiple_accounts(pubkeys, commitment, encoding, data_slice).value
 
     def get_rent_amount(self) -> Decimal: 
         """Return min amount of rent to create an ATA in SOL"""
-        min_balance = int(self.client.get_minimum_balance_for_rent_exemption(config['ATA_ACCOUNT_SIZE']).value)
+        min_balance = rpc_cache.get(('rent', config['ATA_ACCOUNT_SIZE']), float(config['CACHE_RENT_SECONDS']),
+                                    lambda: int(self.client.get_minimum_balance_for_rent_exemption(config['ATA_ACCOUNT_SIZE']).value))
         min_balance = to_sol(min_balance)
         return min_balance
     
-    def walletnotify_shkeeper(self, symbol, txid) -> bool:
-        """Notify SHKeeper about transaction"""
+    def notify_shkeeper_once(self, symbol, txid) -> bool:
+        """Make one attempt to notify SHKeeper about transaction"""
         logger.warning(f"Notifying about {symbol}/{txid}")
-        while True:
-            try:
-                r = rq.post(
-                        f'http://{config["SHKEEPER_HOST"]}/api/v1/walletnotify/{symbol}/{txid}',
-                        headers={'X-Shkeeper-Backend-Key': config['SHKEEPER_KEY']}).json()
-                if r["status"] == "success":
-                    logger.warning(f"The notification about {symbol}/{txid} was successful")
-                    return True
-                else:
-                    logger.warning(f"Failed to notify SHKeeper about {symbol}/{txid}, received response: {r}")
-                    time.sleep(5)
-            except Exception as e:
-                logger.warning(f'Shkeeper notification failed for {symbol}/{txid}: {e}')
-                time.sleep(10)
+        try:
+            r = rq.post(
+                    f'http://{config["SHKEEPER_HOST"]}/api/v1/walletnotify/{symbol}/{txid}',
+                    headers={'X-Shkeeper-Backend-Key': config['SHKEEPER_KEY']},
+                    timeout=float(config['NOTIFY_TIMEOUT'])).json()
+            if r["status"] == "success":
+                logger.warning(f"The notification about {symbol}/{txid} was successful")
+                return True
+            else:
+                logger.warning(f"Failed to notify SHKeeper about {symbol}/{txid}, received response: {r}")
+                return False
+        except Exception as e:
+            logger.warning(f'Shkeeper notification failed for {symbol}/{txid}: {e}')
+            return False
     
     def parse_transaction(self, txid) -> list:
         "Return list of related transactions details for SHKeeper"
         if self.symbol == "SOL":
             related_transactions = []
-            transaction = self.get_transaction(txid)
+            transaction = self.get_confirmed_transaction(txid)
             trx = json.loads(transaction.to_json())
             slot = int(trx['slot'])
             account_keys = trx["transaction"]["message"]["accountKeys"]
@@ -165,11 +228,11 @@ class Coin (Crypto):
             diff_balances = []
             for i in range(len(pre_balances)):
                 diff_balances.append(int(post_balances[i]) - int(pre_balances[i]))
-            list_accounts = get_all_accounts()
+            AddressIndex.refresh()
             addr_indexes = []   
-            confirmations =  int(self.get_slot() - slot)
+            confirmations =  max(0, int(self.get_slot() - slot))
             for i in range(len(account_keys)):
-                if account_keys[i] in list_accounts:
+                if AddressIndex.contains(account_keys[i]):
                     addr_indexes.append(i)
             if len(addr_indexes) == 1:
                 address = account_keys[addr_indexes[0]]
@@ -202,18 +265,18 @@ class Coin (Crypto):
         else:
             # Checking token transaction
             related_transactions = []
-            list_accounts = get_all_accounts()
-            transaction = self.get_transaction(txid)
+            AddressIndex.refresh()
+            transaction = self.get_confirmed_transaction(txid)
             transaction_json = json.loads(transaction.to_json())
             slot = int(transaction_json['slot'])
-            confirmations =  int(self.get_slot() - slot)
+            confirmations =  max(0, int(self.get_slot() - slot))
             pre_token_balances =  transaction_json["meta"]["preTokenBalances"]
             post_token_balances =  transaction_json["meta"]["postTokenBalances"]
             # Internal transaction case (from one-time account to the fee-deposit account)
             if ((len(post_token_balances) == 2)
                 and
-                ((post_token_balances[0]['owner'] in list_accounts and
-                post_token_balances[1]['owner'] in list_accounts) 
+                ((AddressIndex.contains(post_token_balances[0]['owner']) and
+                AddressIndex.contains(post_token_balances[1]['owner'])) 
                 and
                 ((post_token_balances[0]['mint'] == self.token_address and
                 post_token_balances[1]['mint'] == self.token_address)))):
@@ -229,7 +292,7 @@ class Coin (Crypto):
                 logger.warning(f"Related transactions -> {related_transactions}")
             else:   
                 for post_balance in post_token_balances:
-                    if (post_balance['owner'] in list_accounts and 
+                    if (AddressIndex.contains(post_balance['owner']) and 
                         post_balance["mint"] == self.token_address):
                             cur_acc_index = post_balance["accountIndex"]
                             cur_post_balance = int(post_balance["uiTokenAmount"]["amount"])
@@ -274,6 +337,7 @@ class Coin (Crypto):
             with app.app_context():
                 db.session.remove()
                 db.engine.dispose() 
+        AddressIndex.add(pub_address)
         logger.info(f'Created fee-deposit account and added to DB')
 
     def get_fee_deposit_account_address(self) -> str:
@@ -315,18 +379,57 @@ class Coin (Crypto):
         amount = to_sol(Decimal(self.client.get_balance(Pubkey.from_string(address)).value))
         return amount
 
+    def get_accounts_multiple(self, addresses, data_slice=None) -> list:
+        """Return accounts with getMultipleAccounts, MULTIPLE_ACCOUNTS_MAX_SIZE accounts per request
+        and up to MULTIPLE_ACCOUNTS_THREADS_NUMBER requests in flight, an account which does not exist is None"""
+        size = int(config['MULTIPLE_ACCOUNTS_MAX_SIZE'])
+        chunks = [addresses[i:i + size] for i in range(0, len(addresses), size)]
+
+        def fetch(chunk):
+            return self.get_multiple_accounts([Pubkey.from_string(address) for address in chunk], data_slice=data_slice)
+
+        with ThreadPoolExecutor(max_workers=int(config['MULTIPLE_ACCOUNTS_THREADS_NUMBER'])) as executor:
+            return [account for accounts in executor.map(fetch, chunks) for account in accounts]
+
+    def get_balances_multiple(self, addresses) -> list:
+        """Return coin balances in SOL of addresses, an account which does not exist has 0"""
+        # only lamports are needed, skip the account data
+        accounts = self.get_accounts_multiple(addresses, data_slice=DataSliceOpts(offset=0, length=0))
+        return [to_sol(Decimal(account.lamports if account is not None else 0)) for account in accounts]
+
+    def get_associated_token_accounts(self, owner_addresses) -> list:
+        """Return associated token account addresses of owners, derived locally without requests"""
+        return AssociatedTokenAccounts.get_many(owner_addresses, self.token)
+
+    def get_token_balances_multiple(self, owner_addresses) -> list:
+        """Return UI token balances of owners read from their associated token accounts in bulk,
+        an owner without the token account has 0"""
+        # token account layout starts with mint (32 bytes), owner (32 bytes) and amount (u64), for Token-2022 too
+        accounts = self.get_accounts_multiple(self.get_associated_token_accounts(owner_addresses),
+                                              data_slice=DataSliceOpts(offset=64, length=8))
+        decimals = self.get_token_decimals()
+        return [Decimal(int.from_bytes(account.data, 'little')) / 10 ** decimals if account is not None else Decimal(0)
+                for account in accounts]
+
     def get_token_decimals(self) -> int:
-        """Return number of token decimals from token public address"""
-        address = get_token_address(self.symbol)
-        pub_key = Pubkey.from_string(address)
-        info = json.loads(self.client.get_account_info_json_parsed(pub_key).value.to_json())
-        decimals = int(info['data']['parsed']['info']['decimals'])
-        return decimals
+        """Return number of token decimals from token public address, they never change"""
+        if self.token.decimals is not None:
+            return self.token.decimals
+
+        def load():
+            info = json.loads(self.client.get_account_info_json_parsed(self.mint).value.to_json())
+            return int(info['data']['parsed']['info']['decimals'])
+
+        return rpc_cache.get(('decimals', self.token_address), None, load)
 
     def get_token_account_by_owner(self, owner_address) -> str:
         """Return token obj one-time address (ATA) by owner public one-time address """
+        associated_address = AssociatedTokenAccounts.get(owner_address, self.token)
+        if self.get_multiple_accounts([Pubkey.from_string(associated_address)], data_slice=DataSliceOpts(offset=0, length=0))[0]:
+            return associated_address
+        # the owner may have a token account which is not the associated one
         owner_pub_key = Pubkey.from_string(owner_address)
-        token_mint_key = Pubkey.from_string(get_token_address(self.symbol))
+        token_mint_key = self.mint
         account_opts = TokenAccountOpts(mint=token_mint_key)
         result_array = self.client.get_token_accounts_by_owner_json_parsed(owner_pub_key, account_opts).value
         if len(result_array) == 0:
@@ -339,27 +442,34 @@ class Coin (Crypto):
     def create_associated_token_account(self, owner_address) -> str:
         """Create associated token account for owner address"""
         owner_key = Pubkey.from_string(owner_address)
-        token_pub_key = Pubkey.from_string(get_token_address(self.symbol))
-        fee_payer = Keypair.from_seed(self.get_secret_from_address(self.get_fee_deposit_account_address())[:32])
+        token_pub_key = self.mint
+        fee_payer = self.get_keypair(self.get_fee_deposit_account_address())
         token_inst = Token(self.client, token_pub_key, token_pub_key, fee_payer)
         new_address = token_inst.create_associated_token_account(owner_key, token_program_id = self.token_program_id)
         return new_address
         
+    def get_payout_token_accounts(self, dest_addresses) -> list:
+        """Return (token account, exists) of every payout destination found with getMultipleAccounts in bulk,
+        a destination which is a token account of this token is used as is, otherwise its associated one"""
+        # token account layout starts with mint, for Token-2022 too
+        dest_accounts = self.get_accounts_multiple(dest_addresses, data_slice=DataSliceOpts(offset=0, length=32))
+        for dest_address, account in zip(dest_addresses, dest_accounts):
+            if account is not None and account.owner != SYS_PROGRAM_ID and bytes(account.data) != bytes(self.mint):
+                raise Exception(f"Address {dest_address} is ATA for another token, cannot transfer to it")
+        associated_addresses = self.get_associated_token_accounts(dest_addresses)
+        associated_accounts = self.get_accounts_multiple(associated_addresses, data_slice=DataSliceOpts(offset=0, length=0))
+        token_accounts = []
+        for dest_address, account, associated_address, associated_account in zip(dest_addresses, dest_accounts,
+                                                                                 associated_addresses, associated_accounts):
+            if account is not None and account.owner != SYS_PROGRAM_ID:
+                token_accounts.append((dest_address, True))
+            else:
+                token_accounts.append((associated_address, associated_account is not None))
+        return token_accounts
+
     def get_account_token_balance(self, owner_address) -> Decimal:
         """Return obj token balance by owner public address in UI form (e.g. 0.342 USDC)"""
-        owner_pub_key = Pubkey.from_string(owner_address)
-        token_mint_key = Pubkey.from_string(get_token_address(self.symbol))
-        account_opts = TokenAccountOpts(mint=token_mint_key)
-        result_array = self.client.get_token_accounts_by_owner_json_parsed(owner_pub_key, account_opts).value
-        if len(result_array) == 0:
-            ui_amount = Decimal(0)
-        else:
-            json_address = json.loads(result_array[0].to_json())
-            amount = int(json_address["account"]["data"]["parsed"]["info"]["tokenAmount"]["amount"])
-            decimals_number = int(json_address["account"]["data"]["parsed"]["info"]["tokenAmount"]["decimals"])
-            # use decimals from json to minimize requests to the fullnode, also self.to_ui_amount() can be used
-            ui_amount = Decimal(Decimal(amount) / 10 ** decimals_number) 
-        return ui_amount
+        return self.get_token_balances_multiple([owner_address])[0]
 
     def make_multipayout(self, payout_list, fee,) -> list:
         """Send cryto to recepients from payout list"""
@@ -375,7 +485,7 @@ class Coin (Crypto):
             have_crypto = self.get_fee_deposit_coin_balance()
             if have_crypto < (multipayout_amount + (multipayout_fee * num_of_transaction)):
                  raise Exception(f"Have not enough crypto on fee account, need {multipayout_amount + (multipayout_fee * num_of_transaction)} have {have_crypto}")
-            sender_keypair = Keypair.from_seed(self.get_secret_from_address(self.get_fee_deposit_account_address())[:32])
+            sender_keypair = self.get_keypair(self.get_fee_deposit_account_address())
             # there is a limit of trasfers in one transaction, dividing the payout_list to separete transactions if len(payout_list) > MAX_SOL_TRANSFERS_IN_TRANSACTION
             transfer_list = []
             for k in range(num_of_transaction):
@@ -438,21 +548,23 @@ class Coin (Crypto):
             if have_tokens < (multipayout_token_amount):
                  raise Exception(f"Have not enough tokens on fee-deposit account, need {multipayout_token_amount} have {have_tokens}")
             # Check if enough SOL to pay transaction fee
+            token_accounts = self.get_payout_token_accounts([payout['dest'] for payout in payout_list])
             multipayout_token_fee = 0
-            for payout in payout_list:
-                multipayout_token_fee = multipayout_token_fee + self.get_token_transaction_price(payout['dest'])
+            for token_account, exists in token_accounts:
+                multipayout_token_fee = multipayout_token_fee + self.get_coin_transaction_price()
+                if not exists:
+                    multipayout_token_fee = multipayout_token_fee + self.get_rent_amount()
             have_sol = self.get_fee_deposit_coin_balance()
             if have_sol < (multipayout_token_fee):
                  raise Exception(f"Have not enough SOL on fee-deposit account to pay transaction fee, need {multipayout_token_fee * num_of_transaction} have {have_sol}")
             token_payout_list = copy.deepcopy(payout_list)
             # Check if associated token account exist for address, if not - create it and change in payout_list
-            for payout in token_payout_list:
-                associated_token_account = self.get_token_account_by_owner(payout['dest'])
-                if not associated_token_account:
+            for payout, (associated_token_account, exists) in zip(token_payout_list, token_accounts):
+                if not exists:
                     logger.warning(f"There is not ATA for {payout['dest']}, creating")
                     owner_key = Pubkey.from_string(payout['dest'])
-                    token_pub_key = Pubkey.from_string(self.token_address)
-                    fee_payer = Keypair.from_seed(self.get_secret_from_address(self.get_fee_deposit_account_address())[:32])
+                    token_pub_key = self.mint
+                    fee_payer = self.get_keypair(self.get_fee_deposit_account_address())
                     token_inst = Token(self.client, token_pub_key, self.token_program_id, fee_payer)
                     new_address_pubkey = str(token_inst.create_associated_token_account(owner_key))
                     new_address = str(new_address_pubkey)
@@ -461,9 +573,9 @@ class Coin (Crypto):
                 else:
                     payout['dest'] = associated_token_account
             source_pub = Pubkey.from_string(self.get_token_account_by_owner(self.get_fee_deposit_account_address()))
-            owner_pair = Keypair.from_seed(self.get_secret_from_address(self.get_fee_deposit_account_address())[:32])
+            owner_pair = self.get_keypair(self.get_fee_deposit_account_address())
             fee_payer = owner_pair
-            token_pub_key = Pubkey.from_string(get_token_address(self.symbol))
+            token_pub_key = self.mint
             # there is a limit of trasfers in one transaction, dividing the token_payout_list to separete transactions if len(token_payout_list) > MAX_TOKEN_TRANSFERS_IN_TRANSACTION
             transfer_list = []
             for k in range(num_of_transaction):
@@ -482,7 +594,7 @@ class Coin (Crypto):
                     ui_amount = token_payout_list[i * max_transfers + j]['amount']
                     amount = self.to_raw_amount(ui_amount)
                    
-                    if self.symbol == "SOLANA-PYUSD":
+                    if self.token.is_token_2022:
                         token_instructions.append(pyusd_token_transfer(PYUSDTransferParams(
                                                        source=source_pub, 
                                                        dest=dest_pub, 
@@ -538,7 +650,7 @@ class Coin (Crypto):
                 logger.warning(f"Account amount {sol_ui_amount} is below MIN_TRANSFER_THRESHOLD {config['MIN_TRANSFER_THRESHOLD']}, skip draining")
                 return False
             amount = int(to_lamports(sol_ui_amount) - transfer_fee)
-            sender_keypair = Keypair.from_seed(self.get_secret_from_address(account)[:32])
+            sender_keypair = self.get_keypair(account)
             instructions = [transfer(TransferParams(
                 from_pubkey=sender_keypair.pubkey(),
                 to_pubkey=Pubkey.from_string(destination),
@@ -583,20 +695,20 @@ class Coin (Crypto):
             associated_token_account = self.get_token_account_by_owner(destination)
             if not associated_token_account:
                 owner_key = Pubkey.from_string(destination)
-                token_pub_key = Pubkey.from_string(get_token_address(self.symbol))
-                fee_payer = Keypair.from_seed(self.get_secret_from_address(self.get_fee_deposit_account_address())[:32])
+                token_pub_key = self.mint
+                fee_payer = self.get_keypair(self.get_fee_deposit_account_address())
                 token_inst = Token(self.client, token_pub_key, self.token_program_id, fee_payer)
                 new_dest_address = str(token_inst.create_associated_token_account(owner_key))
             else:
                 new_dest_address = associated_token_account
             source_pub = Pubkey.from_string(self.get_token_account_by_owner(account))
             dest_pub = Pubkey.from_string(new_dest_address)
-            owner_pair = Keypair.from_seed(self.get_secret_from_address(account)[:32])
-            token_pub_key = Pubkey.from_string(get_token_address(self.symbol))
+            owner_pair = self.get_keypair(account)
+            token_pub_key = self.mint
             amount = self.to_raw_amount(ui_amount)
-            fee_payer = Keypair.from_seed(self.get_secret_from_address(self.get_fee_deposit_account_address())[:32])
+            fee_payer = self.get_keypair(self.get_fee_deposit_account_address())
           
-            if self.symbol == "SOLANA-PYUSD":
+            if self.token.is_token_2022:
                 token_instructions = [pyusd_token_transfer(PYUSDTransferParams(
                                                source=source_pub, 
                                                dest=dest_pub, 
@@ -660,6 +772,10 @@ class Coin (Crypto):
         secret = json.loads(secret)
         return secret
 
+    def get_keypair(self, address) -> Keypair:
+        """Return a signer of address, decrypted keypairs are cached for a while"""
+        return KeypairCache.get(address, lambda: Keypair.from_seed(self.get_secret_from_address(address)[:32]))
+
     def create_regular_wallet(self) -> str:
         """Create a regular one-time wallet"""
         account = self.generate_account()
@@ -686,6 +802,7 @@ class Coin (Crypto):
             with app.app_context():
                 db.session.remove()
                 db.engine.dispose() 
+        AddressIndex.add(pub_address)
         logger.info(f'Created one-time account and added to DB')
         return pub_address
 
@@ -776,25 +893,17 @@ class Coin (Crypto):
     def get_all_token_transfers(self, from_block, to_block) -> list:
         pass
 
-    def get_all_token_dict(self) -> dict:
-        """Return confirmed token addresses for current blockchain in dict address: symbol"""
-        token_addresses ={}
-        for symbol in config["TOKENS"][config["CURRENT_SOL_NETWORK"]]:
-            token_addresses[config["TOKENS"][config["CURRENT_SOL_NETWORK"]][symbol]['token_address']] = symbol
-        return token_addresses
-
     def get_transaction_symbols(self, transaction_json) -> list: 
         """Return transaction related symbols """
-        list_accounts = get_all_accounts()
+        AddressIndex.refresh()
         symbols = []
         pre_token_balances =  transaction_json["meta"]["preTokenBalances"]
         post_token_balances =  transaction_json["meta"]["postTokenBalances"]
         symbols.append("SOL")
         if len(post_token_balances) != 0 or len(pre_token_balances) != 0:
-            token_dict = self.get_all_token_dict()
             for balance in post_token_balances:
-                if (balance['owner'] in list_accounts and 
-                    balance["mint"] in token_dict.keys()):
-                    symbols.append(token_dict[balance["mint"]])
+                token = TokenRegistry.get_by_mint(balance["mint"])
+                if AddressIndex.contains(balance['owner']) and token is not None:
+                    symbols.append(token.symbol)
         return symbols
 
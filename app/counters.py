@@ -0,0 +1,58 @@
+import os
+import threading
+
+import redis
+
+from .config import config
+from .logging import logger
+
+
+redis_client = redis.Redis(host=config['REDIS_HOST'])
+
+
+class RedisCounters:
+    """Counters of all processes summed in a Redis hash, so /metrics of the API process
+    shows what the celery workers counted too.
+
+    Increments are kept in the process and added to Redis at most COUNTERS_FLUSH_SECONDS
+    later with one request, counting on hot paths such as every RPC request costs no
+    round trip. Counts not flushed yet are lost if the process exits or Redis is down."""
+
+    def __init__(self, key):
+        self.key = key
+        self.pending = {}
+        self.timer = None
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+
+    def inc(self, name, amount=1):
+        with self.lock:
+            if self.pid != os.getpid():
+                # forked celery worker, the parent flushes its own counts
+                self.pid = os.getpid()
+                self.pending = {}
+                self.timer = None
+            self.pending[name] = self.pending.get(name, 0) + amount
+            if self.timer is None:
+                self.timer = threading.Timer(float(config['COUNTERS_FLUSH_SECONDS']), self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        with self.lock:
+            pending = self.pending
+            self.pending = {}
+            self.timer = None
+        if not pending:
+            return
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for name, amount in pending.items():
+                pipeline.hincrby(self.key, name, amount)
+            pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Cannot update counters {self.key}: {e}")
+
+    def get(self) -> dict:
+        """Return counts of all processes by name"""
+        return {name.decode(): int(value) for name, value in redis_client.hgetall(self.key).items()}
@@ -0,0 +1,54 @@
+import redis
+
+from .config import config
+from .logging import logger
+
+
+redis_client = redis.Redis(host=config['REDIS_HOST'])
+COUNTERS_KEY = "solana:drain:counters"
+
+
+def pending_key(symbol, address) -> str:
+    return f"solana:drain:pending:{symbol}:{address}"
+
+
+def schedule_drain(symbol, address):
+    """Run drain_account for the account after the settle window, triggers for
+    the same account until the drain starts are merged into the pending one"""
+    from .tasks import drain_account
+    try:
+        # the key expires on its own if the scheduled task is lost
+        scheduled = redis_client.set(pending_key(symbol, address), 1, nx=True,
+                                     ex=int(config['DRAIN_SETTLE_SECONDS']) + int(config['DRAIN_PENDING_TTL_SECONDS']))
+    except Exception as e:
+        logger.warning(f"Cannot coalesce drain of {symbol} from {address}: {e}, scheduling it directly")
+        drain_account.delay(symbol, address)
+        return
+    if scheduled:
+        drain_account.apply_async((symbol, address), countdown=int(config['DRAIN_SETTLE_SECONDS']))
+        count("scheduled")
+    else:
+        count("coalesced")
+
+
+def drain_started(task, task_id, args, kwargs):
+    """before_start handler of drain_account, it runs before skip_if_running,
+    so triggers from now on schedule another drain even if this one is skipped"""
+    symbol, address = args
+    try:
+        redis_client.delete(pending_key(symbol, address))
+    except Exception as e:
+        logger.warning(f"Cannot clear pending drain of {symbol} from {address}: {e}")
+
+
+def count(name):
+    try:
+        redis_client.hincrby(COUNTERS_KEY, name, 1)
+    except Exception as e:
+        logger.warning(f"Cannot update drain counter {name}: {e}")
+
+
+def get_counters() -> dict:
+    """Return number of scheduled, coalesced and executed drains of all processes"""
+    counters = redis_client.hgetall(COUNTERS_KEY)
+    return {name: int(counters.get(name.encode(), 0)) for name in ("scheduled", "coalesced", "executed")}
@@ -1,102 +1,274 @@
-from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
 import time
-import json
+
+from flask import current_app as app
+from solders.transaction_status import UiAccountsList
 
 from .models import Settings, db
 from .config import config
 from .logging import logger
-from .coin import Coin, get_all_accounts
+from .coin import Coin
+from .address_index import AddressIndex
+from .balances import mark_dirty
+from .drains import schedule_drain
+from .tokens import TokenRegistry
+from . import outbox, scanner_metrics
+
+
+class Checkpoint:
+    """Track the contiguous prefix of finished items.
+
+    on_checkpoint(item) is called with the last item of the prefix when the prefix
+    grew by at least `every` items since the previous call, and on flush()."""
+
+    def __init__(self, items, on_checkpoint, every):
+        self.items = items
+        self.on_checkpoint = on_checkpoint
+        self.every = every
+        self.finished = set()
+        self.prefix = 0   # number of items from the start of the list which are finished
+        self.saved_prefix = 0
+
+    def done(self, index):
+        self.finished.add(index)
+        while self.prefix in self.finished:
+            self.finished.remove(self.prefix)
+            self.prefix += 1
+        if self.prefix - self.saved_prefix >= self.every:
+            self.flush()
+
+    def flush(self):
+        if self.prefix > self.saved_prefix:
+            self.on_checkpoint(self.items[self.prefix - 1])
+            self.saved_prefix = self.prefix
+
+
+def scan_blocks(blocks, worker, max_in_flight, on_checkpoint):
+    """Run worker for every block keeping max_in_flight calls running all the time.
+    on_checkpoint(block) is called when the contiguous prefix of finished blocks grows,
+    at most once per max_in_flight blocks and once more when the scan stops."""
+    checkpoint = Checkpoint(blocks, on_checkpoint, max_in_flight)
+    next_index = 0
+    error = None
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        in_flight = {}
+        while True:
+            while error is None and next_index < len(blocks) and len(in_flight) < max_in_flight:
+                in_flight[executor.submit(worker, blocks[next_index])] = next_index
+                next_index += 1
+            scanner_metrics.blocks_in_flight.set(len(in_flight))
+            scanner_metrics.blocks_queued.set(len(blocks) - next_index)
+            if not in_flight:
+                break
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.warning(f"Block {blocks[index]} failed: {e}")
+                    scanner_metrics.block_failures.inc()
+                    if error is None:
+                        error = e
+                else:
+                    checkpoint.done(index)
+    scanner_metrics.blocks_in_flight.set(0)
+    scanner_metrics.blocks_queued.set(0)
+    checkpoint.flush()
+    if error is not None:
+        raise error
+
+
+def get_account_keys(transaction) -> list:
+    """Return account keys of a transaction, slim blocks have ParsedAccount list instead of a message"""
+    ui_transaction = transaction.transaction
+    if isinstance(ui_transaction, UiAccountsList):
+        return [account.pubkey for account in ui_transaction.account_keys]
+    return ui_transaction.message.account_keys
+
+
+def find_candidates(block, our_keys) -> list:
+    """Return transactions of the block touching our accounts, keys are compared as raw bytes"""
+    candidates = []
+    for transaction in block.transactions:
+        if not our_keys.isdisjoint(map(bytes, get_account_keys(transaction))):
+            candidates.append(transaction)
+            continue
+        for balance in transaction.meta.post_token_balances:
+            if balance.owner is not None and bytes(balance.owner) in our_keys:
+                candidates.append(transaction)
+                break
+    return candidates
+
+
+def get_token_symbols() -> dict:
+    """Return dict raw mint key: symbol of configured tokens"""
+    return {bytes(token.mint): token.symbol for token in TokenRegistry.all()}
+
+
+def match_transaction(transaction, our_keys, token_symbols) -> tuple:
+    """Return symbols to notify about, (symbol, address) pairs to drain and (symbol, address) pairs
+    with changed balances for a candidate transaction. Balances are read from the solders objects,
+    nothing is serialized."""
+    symbols = set()
+    drains = set()
+    touched = set()
+    meta = transaction.meta
+    pre_balances = meta.pre_balances
+    post_balances = meta.post_balances
+    for i, address in enumerate(get_account_keys(transaction)):
+        if bytes(address) in our_keys:
+            diff_balance = post_balances[i] - pre_balances[i]
+            # check if amount of transactions is 0, if yes the do not notify about this trx
+            if diff_balance != 0:
+                symbols.add("SOL")
+                touched.add(("SOL", str(address)))
+                if diff_balance > 0:
+                    drains.add(("SOL", str(address)))
+    for balance in meta.post_token_balances:
+        if balance.owner is not None and bytes(balance.owner) in our_keys:
+            symbol = token_symbols.get(bytes(balance.mint))
+            if symbol is not None:
+                symbols.add(symbol)
+                drains.add((symbol, str(balance.owner)))
+                touched.add((symbol, str(balance.owner)))
+    return symbols, drains, touched
+
+
+class RecentTransactions:
+    """Bounded set of recently handled transaction ids, shared by the block scanner
+    and the websocket listener so a transaction is handled once per process"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.txids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def add(self, txid) -> bool:
+        """Remember txid, return False if it was already handled"""
+        with self.lock:
+            if txid in self.txids:
+                self.txids.move_to_end(txid)
+                return False
+            self.txids[txid] = True
+            if len(self.txids) > self.maxsize:
+                self.txids.popitem(last=False)
+            return True
+
+
+recent_transactions = RecentTransactions(int(config['EVENTS_RECENT_TRANSACTIONS']))
+
+
+def handle_transaction(coin, txid, symbols, drains, touched):
+    """Drain accounts, mark changed balances and schedule SHKeeper notifications about a matched transaction"""
+    # marked every time, a balance refreshed after the websocket notification at confirmed
+    # commitment may still be the one from before the transaction
+    mark_dirty(touched)
+    if not recent_transactions.add(txid):
+        logger.warning(f"Transaction {txid} is already handled, skip it")
+        return
+    # the transaction is not handled again, so the notifications are queued before anything can fail
+    for symbol in symbols:
+        outbox.enqueue(symbol, txid)
+    for symbol, address in drains:
+        try:
+            schedule_drain(symbol, address)
+        except Exception as e:
+            logger.warning(f"Cannot schedule drain of {symbol} from {address} for {txid}: {e}, the next balance refresh retries it")
+
+
+def check_block(coin, block, buf, our_keys, token_symbols):
+    for transaction in find_candidates(buf, our_keys):
+        symbols, drains, touched = match_transaction(transaction, our_keys, token_symbols)
+        if not symbols:
+            continue
+        scanner_metrics.transactions_matched.inc()
+        txid = str(transaction.transaction.signatures[0])
+        logger.warning(f"Found related transaction {txid} in block {block}: {sorted(symbols)}")
+        handle_transaction(coin, txid, symbols, drains, touched)
+    scanner_metrics.blocks_processed.inc()
+
+
+def check_in_parallel(coin, block, our_keys, token_symbols):
+    with scanner_metrics.block_seconds.time():
+        check_block(coin, block, coin.get_block(block), our_keys, token_symbols)
+    return 1
+
+
+def check_batch_in_parallel(coin, blocks, our_keys, token_symbols):
+    start_time = time.time()
+    for block, buf in zip(blocks, coin.get_blocks_batch(blocks)):
+        if isinstance(buf, Exception):
+            logger.warning(f"Batch request for block {block} failed: {buf}, requesting it separately")
+            scanner_metrics.block_retries.inc()
+            buf = coin.get_block(block)
+        check_block(coin, block, buf, our_keys, token_symbols)
+    # blocks of a batch share one request, each of them gets an equal share of the time
+    for _ in blocks:
+        scanner_metrics.block_seconds.observe((time.time() - start_time) / len(blocks))
+    return 1
+
+
+def save_last_block(block):
+    # notifications about checked blocks must be stored before the checkpoint moves
+    outbox.flush()
+    pd = Settings.query.filter_by(name = "last_block").first()
+    pd.value = block
+    with app.app_context():
+        db.session.add(pd)
+        db.session.commit()
+        db.session.close()
 
 
 def log_loop(last_checked_block, check_interval):
-    from .tasks import drain_account
     from app import create_app
+    from .backfill import catch_up
     app = create_app()
     app.app_context().push()
 
     coin = Coin("SOL")
+    token_symbols = get_token_symbols()
 
     while True:       
         last_block = coin.get_slot()
         if last_checked_block == '' or last_checked_block is None:
             last_checked_block = last_block	
+        backfilled_block = catch_up(coin, last_checked_block, last_block, token_symbols)
+        if backfilled_block is not None:
+            last_checked_block = backfilled_block
+            continue
         # avoid too big block range
         if int(last_block) - int(last_checked_block) > 10000:
             last_block = int(last_checked_block) + 10000
         blocks_list = coin.get_blocks(last_checked_block, last_block)
-        our_addresses = set(get_all_accounts()) 
+        our_keys = AddressIndex.get_keys()
         if last_checked_block > last_block:
             logger.exception(f'Last checked block {last_checked_block} is bigger than last block {last_block} in blockchain')
         elif len(blocks_list) > int(config['EVENTS_MIN_DIFF_TO_RUN_PARALLEL']):
-            def check_in_parallel(block):
-                buf = coin.get_block(block)
-                for transaction in buf.transactions:
-                    symbols = []
-                    for address in transaction.transaction.message.account_keys:
-                        if str(address) in our_addresses:
-                            logger.warning("Found related transaction")
-                            transaction_json = json.loads(transaction.to_json())
-                            logger.warning(transaction_json) 
-                            # check if amount of transactions is 0, if yes the do not notify about this trx
-                            pre_coin_balances =  transaction_json["meta"]["preBalances"]
-                            post_coin_balances =  transaction_json["meta"]["postBalances"]
-                            diff_balances = []
-                            for i in range(len(pre_coin_balances)):
-                                diff_balances.append(int(post_coin_balances[i]) - int(pre_coin_balances[i]))
-                            for i in range(len(transaction.transaction.message.account_keys)):
-                                if address == transaction.transaction.message.account_keys[i]:
-                                    logger.warning(f"Address {address} in address_keys")
-                                    if diff_balances[i] > 0 or diff_balances[i] < 0:
-                                        logger.warning(f"Balance difference is not zero: {diff_balances[i]} notify")
-                                        symbols.append("SOL")
-                                        if diff_balances[i] > 0:
-                                            drain_account.delay('SOL', str(address))
-                                    else:
-                                        logger.warning(f"Balance difference is {diff_balances[i]} skip it")
-                    for balance in transaction.meta.post_token_balances:
-                        if str(balance.owner) in our_addresses:
-                            logger.warning("Found related transaction")
-                            transaction_json = json.loads(transaction.to_json())
-                            logger.warning(transaction_json) 
-                            pre_token_balances =  transaction_json["meta"]["preTokenBalances"]
-                            post_token_balances =  transaction_json["meta"]["postTokenBalances"]
-                            if len(post_token_balances) != 0 or len(pre_token_balances) != 0:
-                                token_dict = coin.get_all_token_dict()
-                                for balance in post_token_balances:
-                                    if (balance['owner'] in our_addresses and 
-                                        balance["mint"] in token_dict.keys()):
-                                        symbols.append(token_dict[balance["mint"]])
-                                        drain_account.delay(token_dict[balance["mint"]], balance['owner'])
-                    symbols_set = set(symbols)
-                    for symbol in symbols_set:
-                        coin.walletnotify_shkeeper(symbol, transaction_json['transaction']['signatures'][0])
-                return 1
-            with ThreadPoolExecutor(max_workers=config['EVENTS_MAX_THREADS_NUMBER']) as executor:
-                try:
-                    for j in range((len(blocks_list) - 1) // int(config['EVENTS_MAX_THREADS_NUMBER'])):
-                        blocks = []
-                        for i in range(int(config['EVENTS_MAX_THREADS_NUMBER'])):
-                            blocks.append(blocks_list[1 + i + (j * int(config['EVENTS_MAX_THREADS_NUMBER']))])
-                        start_time = time.time()
-                        logger.warning(f'Working on {blocks[0]} - {blocks[-1]}')
-                        results = list(executor.map(check_in_parallel, blocks))
-                        logger.warning(f'Block chunk {blocks[0]} - {blocks[-1]} processed for {time.time() - start_time} seconds')
-                        if results and all(results):
-                            last_checked_block = blocks[-1] #last_checked_block = blocks[-1]
-                            pd = Settings.query.filter_by(name = "last_block").first()
-                            pd.value = last_checked_block
-                            with app.app_context():
-                                db.session.add(pd)
-                                db.session.commit()
-                                db.session.close()
-                        else:
-                            logger.warning(f"Some blocks failed, retrying chunk {blocks[0]} - {blocks[-1]}")
-                except Exception as e:
-                    raise e
-                    sleep_sec = 6
-                    logger.warning(f"Exception in main block scanner loop: {e}")
-                    logger.warning(f"Waiting {sleep_sec} seconds before retry.")
-                    time.sleep(sleep_sec)
+            def save_checkpoint(block):
+                nonlocal last_checked_block
+                last_checked_block = block
+                save_last_block(block)
+            # blocks_list starts with the already checked block
+            blocks = [block for block in blocks_list if int(block) > int(last_checked_block)]
+            start_time = time.time()
+            logger.warning(f'Working on {blocks[0]} - {blocks[-1]}')
+            blocks_per_request = int(config['EVENTS_BLOCKS_PER_REQUEST'])
+            if blocks_per_request > 1:
+                def worker(batch):
+                    return check_batch_in_parallel(coin, batch, our_keys, token_symbols)
+                batches = [blocks[i:i + blocks_per_request] for i in range(0, len(blocks), blocks_per_request)]
+                scan_blocks(batches, worker, int(config['EVENTS_MAX_THREADS_NUMBER']), 
+                            lambda batch: save_checkpoint(batch[-1]))
+            else:
+                def worker(block):
+                    return check_in_parallel(coin, block, our_keys, token_symbols)
+                scan_blocks(blocks, worker, int(config['EVENTS_MAX_THREADS_NUMBER']), save_checkpoint)
+            scanner_metrics.chunk_seconds.observe(time.time() - start_time)
+            scanner_metrics.chunk_blocks.observe(len(blocks))
+            logger.warning(f'Blocks {blocks[0]} - {blocks[-1]} processed for {time.time() - start_time} seconds')
         else:
             logger.warning("Waiting for a new slots")
             time.sleep(check_interval)
@@ -119,14 +291,26 @@ def events_listener():
             db.session.remove()
             db.engine.dispose()
     
+    if config['EVENTS_WS_ENABLED'].lower() == 'true':
+        from .ws_events import ws_listener
+        threading.Thread(daemon=True, name="WS Push Listener", target=ws_listener).start()
+
     while True:
         try:
             pd = Settings.query.filter_by(name = "last_block").first()
             last_checked_block = int(pd.value)
-            log_loop(last_checked_block, int(config["CHECK_NEW_BLOCK_EVERY_SECONDS"]))
+            if config['EVENTS_LISTENER_MODE'] == 'async':
+                from .async_events import async_log_loop
+                async_log_loop(last_checked_block, int(config["CHECK_NEW_BLOCK_EVERY_SECONDS"]))
+            elif config['EVENTS_LISTENER_MODE'] == 'sharded':
+                from .leases import sharded_log_loop
+                sharded_log_loop(int(config["CHECK_NEW_BLOCK_EVERY_SECONDS"]))
+            else:
+                log_loop(last_checked_block, int(config["CHECK_NEW_BLOCK_EVERY_SECONDS"]))
         except BaseException as e:
             sleep_sec = 60
             logger.exception(f"Exception in main block scanner loop: {e}")
+            scanner_metrics.scanner_restarts.inc()
             logger.warning(f"Waiting {sleep_sec} seconds before retry.")           
             time.sleep(sleep_sec)
 
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+import threading
+import time
+
+from .config import config
+from .counters import RedisCounters
+
+
+# hits, misses and evictions:<reason> of drains and payouts run by celery workers
+counters = RedisCounters("solana:keypair_cache:counters")
+
+
+class KeypairCache:
+    """Decrypted keypairs of recently used accounts, least recently used first.
+
+    At most KEYPAIR_CACHE_SIZE keypairs are kept, each one for KEYPAIR_CACHE_SECONDS
+    after it was loaded, so secrets do not stay in memory longer than needed."""
+    keypairs = OrderedDict()
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls, address, loader):
+        """Return cached keypair of address or store and return loader() result"""
+        now = time.monotonic()
+        with cls.lock:
+            entry = cls.keypairs.get(address)
+            if entry is not None and entry[1] > now:
+                cls.keypairs.move_to_end(address)
+                counters.inc("hits")
+                return entry[0]
+            if entry is not None:
+                del cls.keypairs[address]
+                counters.inc("evictions:expired")
+        counters.inc("misses")
+        keypair = loader()
+        with cls.lock:
+            cls.keypairs[address] = (keypair, now + float(config['KEYPAIR_CACHE_SECONDS']))
+            cls.keypairs.move_to_end(address)
+            while len(cls.keypairs) > int(config['KEYPAIR_CACHE_SIZE']):
+                cls.keypairs.popitem(last=False)
+                counters.inc("evictions:size")
+        return keypair
+
+    @classmethod
+    def evict(cls, address):
+        with cls.lock:
+            if cls.keypairs.pop(address, None) is not None:
+                counters.inc("evictions:explicit")
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            counters.inc("evictions:explicit", len(cls.keypairs))
+            cls.keypairs.clear()
@@ -0,0 +1,148 @@
+import datetime
+import os
+import socket
+import threading
+import time
+
+from flask import current_app as app
+from sqlalchemy import and_, or_
+
+from .config import config
+from .logging import logger
+from .coin import Coin
+from .address_index import AddressIndex
+from .events import check_in_parallel, get_token_symbols, scan_blocks
+from .models import Settings, SlotLeases, db
+from . import outbox
+
+
+def lease_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+def lease_expiration() -> datetime.datetime:
+    # lease times are compared between nodes, keep their clocks in sync
+    return datetime.datetime.utcnow() + datetime.timedelta(seconds=int(config['SHARD_LEASE_TTL_SECONDS']))
+
+
+def coordinate(last_slot):
+    """Advance last_block over contiguous done leases and split new slots up to last_slot into pending leases.
+    The last_block row is locked for the time of the transaction, so one node coordinates at a time."""
+    try:
+        settings = Settings.query.filter_by(name = "last_block").with_for_update().first()
+        last_block = int(settings.value)
+        outstanding = 0
+        last_leased = last_block
+        for lease in SlotLeases.query.order_by(SlotLeases.start_slot).all():
+            if outstanding == 0 and lease.status == "done" and lease.start_slot <= last_block + 1:
+                last_block = max(last_block, lease.end_slot)
+                db.session.delete(lease)
+            else:
+                outstanding += 1
+            last_leased = max(last_leased, lease.end_slot)
+        if last_block != int(settings.value):
+            logger.warning(f"Sharded scan moved last_block to {last_block}")
+            settings.value = last_block
+        start = last_leased + 1
+        while (outstanding < int(config['SHARD_MAX_PENDING_LEASES']) and
+               last_slot - start + 1 >= int(config['EVENTS_MIN_DIFF_TO_RUN_PARALLEL'])):
+            end = min(start + int(config['SHARD_LEASE_SIZE']) - 1, last_slot)
+            db.session.add(SlotLeases(start_slot = start,
+                                      end_slot = end,
+                                      last_checked = start - 1,
+                                      status = "pending"))
+            outstanding += 1
+            start = end + 1
+        with app.app_context():
+            db.session.commit()
+            db.session.close()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def claim_lease():
+    """Take the oldest pending or expired lease, return dict with its fields or None"""
+    try:
+        lease = (SlotLeases.query
+                           .filter(or_(SlotLeases.status == "pending",
+                                       and_(SlotLeases.status == "leased",
+                                            SlotLeases.expires_at < datetime.datetime.utcnow())))
+                           .order_by(SlotLeases.start_slot)
+                           .with_for_update(skip_locked=True)
+                           .first())
+        if not lease:
+            db.session.rollback()
+            return None
+        if lease.status == "leased":
+            logger.warning(f"Lease {lease.start_slot} - {lease.end_slot} of {lease.owner} expired, taking it over")
+        lease.status = "leased"
+        lease.owner = lease_owner()
+        lease.expires_at = lease_expiration()
+        claimed = {'id': lease.id,
+                   'start_slot': lease.start_slot,
+                   'end_slot': lease.end_slot,
+                   'last_checked': lease.last_checked}
+        with app.app_context():
+            db.session.commit()
+            db.session.close()
+        return claimed
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def update_lease(lease_id, **values):
+    """Update our lease and renew it, raise if the lease was taken over by another node"""
+    if 'last_checked' in values:
+        outbox.flush()
+    try:
+        updated = (SlotLeases.query
+                             .filter_by(id = lease_id, owner = lease_owner(), status = "leased")
+                             .update(dict(values, expires_at = lease_expiration())))
+        with app.app_context():
+            db.session.commit()
+            db.session.close()
+    except Exception:
+        db.session.rollback()
+        raise
+    if not updated:
+        raise Exception(f"Lease {lease_id} is not ours anymore")
+
+
+def release_lease(lease_id):
+    update_lease(lease_id, status = "pending", owner = None)
+
+
+def sharded_log_loop(check_interval):
+    """Block scanner which processes slot range leases, several of them can run on different nodes"""
+    coin = Coin("SOL")
+    token_symbols = get_token_symbols()
+
+    while True:
+        coordinate(coin.get_slot())
+        lease = claim_lease()
+        if not lease:
+            logger.warning("Waiting for a new slots")
+            time.sleep(check_interval)
+            continue
+        try:
+            blocks_list = coin.get_blocks(lease['last_checked'], lease['end_slot'])
+            blocks = [block for block in blocks_list if int(block) > int(lease['last_checked'])]
+            our_keys = AddressIndex.get_keys()
+
+            def worker(block):
+                return check_in_parallel(coin, block, our_keys, token_symbols)
+
+            start_time = time.time()
+            logger.warning(f"Working on lease {lease['start_slot']} - {lease['end_slot']}")
+            scan_blocks(blocks, worker, int(config['EVENTS_MAX_THREADS_NUMBER']),
+                        lambda block: update_lease(lease['id'], last_checked = block))
+            update_lease(lease['id'], last_checked = lease['end_slot'], status = "done")
+            logger.warning(f"Lease {lease['start_slot']} - {lease['end_slot']} processed for {time.time() - start_time} seconds")
+        except Exception:
+            try:
+                release_lease(lease['id'])
+            except Exception as e:
+                logger.warning(f"Cannot release lease {lease['id']}: {e}")
+            raise
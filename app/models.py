@@ -1,3 +1,5 @@
+import datetime
+
 from .db_import import db
 
 
@@ -28,4 +30,36 @@ class Wallets(db.Model):
                                         onupdate=db.func.current_timestamp())
     status = db.Column(db.String(10))
     type = db.Column(db.String(30))
-    __table_args__ = (db.UniqueConstraint('id'), )
\ No newline at end of file
+    __table_args__ = (db.UniqueConstraint('id'), )
+
+
+class SlotLeases(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    start_slot = db.Column(db.BigInteger)
+    end_slot = db.Column(db.BigInteger)
+    last_checked = db.Column(db.BigInteger) # progress inside the lease, start_slot - 1 when not started
+    status = db.Column(db.String(10)) # pending, leased, done
+    owner = db.Column(db.String(100))
+    expires_at = db.Column(db.DateTime)
+    __table_args__ = (db.UniqueConstraint('id'), db.Index('ix_slot_leases_start_slot', 'start_slot'), )
+
+
+class Notifications(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    symbol = db.Column(db.String(20))
+    txid = db.Column(db.String(100))
+    status = db.Column(db.String(10)) # pending, sending, sent
+    attempts = db.Column(db.Integer, default=0)
+    # UTC from Python, the outbox compares both with datetime.utcnow() whatever the database time zone is
+    next_attempt = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    created = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    __table_args__ = (db.UniqueConstraint('id'), db.UniqueConstraint('symbol', 'txid'), 
+                      db.Index('ix_notifications_status_next_attempt', 'status', 'next_attempt'), )
+
+
+class TokenAccounts(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String(70))
+    mint = db.Column(db.String(70))
+    address = db.Column(db.String(70)) # associated token account, it may not exist on chain yet
+    __table_args__ = (db.UniqueConstraint('id'), db.UniqueConstraint('owner', 'mint'), )
@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import queue
+import time
+
+from flask import current_app as app
+
+from .config import config
+from .logging import logger
+from .models import Notifications, db
+
+
+# Scanner threads have no application context, they put notifications here and
+# a thread with the context writes them to the outbox table with flush()
+pending = queue.SimpleQueue()
+
+
+def enqueue(symbol, txid):
+    """Schedule SHKeeper notification about transaction, it is durable after the next flush()"""
+    pending.put((symbol, txid))
+
+
+def flush():
+    """Write enqueued notifications to the outbox table, duplicates are ignored"""
+    rows = []
+    now = datetime.datetime.utcnow()
+    while True:
+        try:
+            symbol, txid = pending.get_nowait()
+        except queue.Empty:
+            break
+        rows.append({'symbol': symbol, 'txid': txid, 'status': 'pending', 'attempts': 0, 'next_attempt': now, 'created': now})
+    if not rows:
+        return
+    try:
+        db.session.execute(Notifications.__table__.insert()
+                                                  .prefix_with('IGNORE', dialect='mysql')
+                                                  .prefix_with('OR IGNORE', dialect='sqlite'), rows)
+        with app.app_context():
+            db.session.commit()
+            db.session.close()
+    except Exception:
+        db.session.rollback()
+        for row in rows:
+            pending.put((row['symbol'], row['txid']))
+        raise
+
+
+def get_queue_depth() -> int:
+    return Notifications.query.filter(Notifications.status.in_(('pending', 'sending'))).count()
+
+
+def get_backoff(attempts) -> int:
+    return min(int(config['NOTIFY_BACKOFF_SECONDS']) * 2 ** attempts, int(config['NOTIFY_MAX_BACKOFF_SECONDS']))
+
+
+def claim() -> list:
+    """Take due notifications for delivery by this dispatcher.
+
+    Rows locked by a dispatcher of another node are skipped, claimed rows get status
+    sending and are due again after NOTIFY_CLAIM_SECONDS if this dispatcher dies."""
+    now = datetime.datetime.utcnow()
+    try:
+        rows = (Notifications.query
+                             .filter(Notifications.status.in_(('pending', 'sending')), Notifications.next_attempt <= now)
+                             .order_by(Notifications.next_attempt)
+                             .limit(int(config['NOTIFY_BATCH_SIZE']))
+                             .with_for_update(skip_locked=True)
+                             .all())
+        due = [(row.id, row.symbol, row.txid, row.attempts) for row in rows]
+        if due:
+            Notifications.query.filter(Notifications.id.in_([row[0] for row in due])).update({
+                'status': 'sending',
+                'next_attempt': now + datetime.timedelta(seconds=int(config['NOTIFY_CLAIM_SECONDS'])),
+            }, synchronize_session=False)
+        with app.app_context():
+            db.session.commit()
+            db.session.close()
+    except Exception:
+        db.session.rollback()
+        raise
+    return due
+
+
+def dispatch(executor, coin) -> int:
+    """Deliver due notifications, return number of tried ones"""
+    due = claim()
+    if not due:
+        return 0
+    results = list(executor.map(lambda row: coin.notify_shkeeper_once(row[1], row[2]), due))
+    try:
+        for (row_id, symbol, txid, attempts), delivered in zip(due, results):
+            if delivered:
+                Notifications.query.filter_by(id = row_id).update({'status': 'sent', 'attempts': attempts + 1})
+            else:
+                backoff = get_backoff(attempts)
+                logger.warning(f"Notification about {symbol}/{txid} failed {attempts + 1} times, next try in {backoff} seconds")
+                # the claim may have expired and the notification been delivered by another node
+                Notifications.query.filter_by(id = row_id, status = 'sending').update({
+                    'status': 'pending',
+                    'attempts': attempts + 1,
+                    'next_attempt': datetime.datetime.utcnow() + datetime.timedelta(seconds=backoff),
+                })
+        with app.app_context():
+            db.session.commit()
+            db.session.close()
+    except Exception:
+        db.session.rollback()
+        raise
+    return len(due)
+
+
+def cleanup():
+    """Remove sent notifications older than NOTIFY_KEEP_SENT_DAYS, until then they deduplicate new ones"""
+    expired = datetime.datetime.utcnow() - datetime.timedelta(days=int(config['NOTIFY_KEEP_SENT_DAYS']))
+    try:
+        Notifications.query.filter(Notifications.status == 'sent', Notifications.created < expired).delete()
+        with app.app_context():
+            db.session.commit()
+            db.session.close()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def notifications_dispatcher():
+    """Deliver outbox notifications to SHKeeper with concurrency and exponential backoff"""
+    from app import create_app
+    from .coin import Coin
+    app = create_app()
+    app.app_context().push()
+    coin = Coin("SOL")
+    last_cleanup = 0
+    with ThreadPoolExecutor(max_workers=int(config['NOTIFY_THREADS_NUMBER'])) as executor:
+        while True:
+            try:
+                flush()
+                if time.time() - last_cleanup > 3600:
+                    cleanup()
+                    last_cleanup = time.time()
+                if not dispatch(executor, coin):
+                    time.sleep(1)
+            except Exception as e:
+                sleep_sec = 10
+                logger.exception(f"Exception in notifications dispatcher: {e}")
+                logger.warning(f"Waiting {sleep_sec} seconds before retry.")
+                time.sleep(sleep_sec)
@@ -0,0 +1,28 @@
+from solana.rpc.core import RPCException
+from solders.rpc.responses import batch_from_json
+
+from .config import config
+
+
+def normalize_raw(raw) -> str:
+    """Some solana nodes reply null instead of empty loaded addresses, the Dockerfile patches
+    _parse_raw of solana-py the same way for single requests"""
+    return raw.replace('"readonly":null', '"readonly":[]').replace('"writable":null', '"writable":[]')
+
+
+def make_batch_request(client, bodies, parsers) -> list:
+    """Send requests to the fullnode as JSON-RPC batches of at most RPC_BATCH_MAX_SIZE requests.
+
+    Return responses in the order of bodies. A request failed on the node side gets
+    RPCException in its place, so callers can retry or skip it separately."""
+    results = []
+    max_size = int(config['RPC_BATCH_MAX_SIZE'])
+    for i in range(0, len(bodies), max_size):
+        raw = normalize_raw(client._provider.make_batch_request_unparsed(tuple(bodies[i:i + max_size])))
+        # solana nodes keep the order of requests in the batch reply
+        for parser, parsed in zip(parsers[i:i + max_size], batch_from_json(raw, parsers[i:i + max_size])):
+            if not isinstance(parsed, parser):
+                results.append(RPCException(parsed))
+            else:
+                results.append(parsed)
+    return results
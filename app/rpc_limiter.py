@@ -0,0 +1,163 @@
+import asyncio
+import json
+import threading
+import time
+
+import httpx
+from prometheus_client import Counter, Gauge
+
+from .config import config
+from .logging import logger
+
+
+concurrency_limit = Gauge('solana_rpc_concurrency_limit', 'Current adaptive limit of concurrent RPC requests')
+requests_in_flight = Gauge('solana_rpc_requests_in_flight', 'RPC requests being sent by the pooled client')
+overloads = Counter('solana_rpc_overloads', 'Responses treated as overload of the fullnode', ['reason'])
+
+
+class AIMDLimiter:
+    """Limit of concurrent requests with additive increase and multiplicative decrease.
+
+    Every healthy response raises the limit by 1/limit, so about one more request per
+    round trip. A 429, a timeout or a response much slower than usual for its method
+    cuts the limit in half. Requests sent before a cut report their overload after it,
+    so the limit is cut at most once per latency of the overloaded request and never
+    more often than every RPC_LIMITER_DECREASE_SECONDS.
+
+    Threads wait in acquire, coroutines of the async scanner in acquire_async, both
+    share the same limit."""
+
+    def __init__(self, initial, minimum, maximum):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self.baselines = {}
+        self.decreased_at = 0
+        self.condition = threading.Condition()
+        self.async_waiters = []
+        concurrency_limit.set(self.limit)
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+            requests_in_flight.set(self.in_flight)
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    requests_in_flight.set(self.in_flight)
+                    return
+                waiter = loop.create_future()
+                self.async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, method, seconds, overload_reason=None):
+        with self.condition:
+            self.in_flight -= 1
+            requests_in_flight.set(self.in_flight)
+            baseline = self.baselines.get(method)
+            if (overload_reason is None and baseline is not None and
+                seconds > max(baseline * float(config['RPC_LIMITER_SPIKE_FACTOR']), float(config['RPC_LIMITER_MIN_SPIKE_SECONDS']))):
+                overload_reason = 'latency'
+            if overload_reason is None:
+                # slow moving average, a spike does not become the new normal at once
+                self.baselines[method] = seconds if baseline is None else baseline * 0.95 + seconds * 0.05
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                overloads.labels(overload_reason).inc()
+                if time.time() - self.decreased_at > max(seconds, float(config['RPC_LIMITER_DECREASE_SECONDS'])):
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self.decreased_at = time.time()
+                    logger.warning(f"RPC overload ({overload_reason} of {method}), concurrency limit is {int(self.limit)}")
+            concurrency_limit.set(self.limit)
+            self.condition.notify_all()
+            waiters = self.async_waiters
+            self.async_waiters = []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(wake, waiter)
+
+
+def wake(waiter):
+    # the waiting coroutine may be cancelled already
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class LimitedTransport(httpx.BaseTransport):
+    """Transport sending requests of the wrapped one within the adaptive limit"""
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    def handle_request(self, request) -> httpx.Response:
+        method = get_method(request)
+        self.limiter.acquire()
+        start_time = time.time()
+        overload_reason = None
+        try:
+            response = self.transport.handle_request(request)
+            response.read()
+            if is_rate_limited(response):
+                overload_reason = 'rate_limit'
+            return response
+        except httpx.TimeoutException:
+            overload_reason = 'timeout'
+            raise
+        finally:
+            self.limiter.release(method, time.time() - start_time, overload_reason)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    """Async transport sending requests of the wrapped one within the adaptive limit"""
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    async def handle_async_request(self, request) -> httpx.Response:
+        method = get_method(request)
+        await self.limiter.acquire_async()
+        start_time = time.time()
+        overload_reason = None
+        try:
+            response = await self.transport.handle_async_request(request)
+            await response.aread()
+            if is_rate_limited(response):
+                overload_reason = 'rate_limit'
+            return response
+        except httpx.TimeoutException:
+            overload_reason = 'timeout'
+            raise
+        finally:
+            self.limiter.release(method, time.time() - start_time, overload_reason)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def get_method(request) -> str:
+    """Return JSON-RPC method of the request, batches are told apart by their first method"""
+    try:
+        body = json.loads(request.content)
+    except ValueError:
+        return ''
+    if isinstance(body, list):
+        return f"batch:{body[0].get('method') if body else ''}"
+    return body.get('method', '')
+
+
+def is_rate_limited(response) -> bool:
+    """Providers answer with HTTP 429 or with a short JSON-RPC error of code 429"""
+    if response.status_code == 429:
+        return True
+    return len(response.content) < 1024 and b'"code":429' in response.content.replace(b' ', b'')
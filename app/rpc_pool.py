@@ -0,0 +1,87 @@
+import os
+import threading
+
+import httpx
+from solana.rpc.api import Client
+
+from .config import config
+from .counters import RedisCounters
+from .rpc_limiter import AIMDLimiter, LimitedTransport
+from .rpc_router import RoutingTransport, get_endpoints
+
+
+# requests and connections of the pooled clients of all processes
+counters = RedisCounters("solana:rpc:counters")
+
+
+class CountingTransport(httpx.HTTPTransport):
+    """HTTP transport counting requests and new connections, requests minus
+    connections is how many times a kept alive connection was reused"""
+
+    def handle_request(self, request):
+        request.extensions["trace"] = self.trace
+        counters.inc("requests")
+        return super().handle_request(request)
+
+    def trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            counters.inc("connections")
+
+
+class ClientPool:
+    """One solana Client per process shared by all Coin instances.
+
+    httpx.Client is thread-safe and keeps up to RPC_POOL_MAX_KEEPALIVE
+    connections open, the client is created again in a forked process
+    (celery workers) so the parent's connections are never shared."""
+    client = None
+    limiter = None
+    pid = None
+    lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls) -> Client:
+        with cls.lock:
+            if cls.client is None or cls.pid != os.getpid():
+                cls.limiter = None
+                cls.client = cls.create_client()
+                cls.pid = os.getpid()
+            return cls.client
+
+    @classmethod
+    def get_limiter(cls):
+        """Return the adaptive limiter of the process client, None if it is disabled"""
+        cls.get_client()
+        return cls.limiter
+
+    @classmethod
+    def create_client(cls) -> Client:
+        timeout = float(config['FULLNODE_TIMEOUT'])
+        urls = get_endpoints()
+
+        def make_transport():
+            return CountingTransport(
+                limits=httpx.Limits(max_connections=int(config['RPC_POOL_MAX_CONNECTIONS']),
+                                    max_keepalive_connections=int(config['RPC_POOL_MAX_KEEPALIVE']),
+                                    keepalive_expiry=float(config['RPC_POOL_KEEPALIVE_SECONDS'])),
+            )
+
+        transport = RoutingTransport(urls, make_transport) if len(urls) > 1 else make_transport()
+        if config['RPC_LIMITER_ENABLED'].lower() == 'true':
+            cls.limiter = AIMDLimiter(int(config['RPC_LIMITER_INITIAL']),
+                                      int(config['RPC_LIMITER_MIN']),
+                                      int(config['RPC_POOL_MAX_CONNECTIONS']))
+            transport = LimitedTransport(transport, cls.limiter)
+        client = Client(urls[0], timeout=timeout)
+        client._provider.session = httpx.Client(
+            timeout=httpx.Timeout(timeout, connect=float(config['RPC_POOL_CONNECT_TIMEOUT'])),
+            transport=transport,
+        )
+        return client
+
+def get_client() -> Client:
+    return ClientPool.get_client()
+
+
+def get_limiter():
+    return ClientPool.get_limiter()
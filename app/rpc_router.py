@@ -0,0 +1,194 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import json
+import re
+import threading
+import time
+
+import httpx
+from prometheus_client import Gauge
+
+from .config import config
+from .logging import logger
+
+
+# methods creating transactions go to one endpoint, a blockhash from a lagging
+# node may be unknown to another one
+STICKY_METHODS = {'sendTransaction', 'simulateTransaction', 'requestAirdrop', 'getLatestBlockhash', 'isBlockhashValid'}
+# a key, quotes inside JSON strings such as log messages are escaped
+ERROR_KEY = re.compile(rb'"error"\s*:')
+
+endpoint_latency = Gauge('solana_rpc_endpoint_latency_seconds', 'Smoothed response time of the RPC endpoint', ['endpoint'])
+endpoint_slot_lag = Gauge('solana_rpc_endpoint_slot_lag', 'Slots the RPC endpoint is behind the best one', ['endpoint'])
+endpoint_healthy = Gauge('solana_rpc_endpoint_healthy', 'RPC endpoint is used for reads', ['endpoint'])
+
+
+def get_endpoints() -> list:
+    """Return FULLNODE_URLS or the single FULLNODE_URL"""
+    urls = [url.strip() for url in config['FULLNODE_URLS'].split(',') if url.strip()]
+    return urls or [config['FULLNODE_URL']]
+
+
+class Endpoint:
+
+    def __init__(self, url, transport):
+        self.url = url
+        self.transport = transport
+        self.latency = None
+        self.slot = None
+        self.lag = 0
+        self.failed_at = 0
+
+    def is_healthy(self) -> bool:
+        return (time.time() - self.failed_at > float(config['RPC_ENDPOINT_COOLDOWN_SECONDS']) and
+                self.lag <= int(config['RPC_MAX_SLOT_LAG']))
+
+    def observe(self, seconds):
+        # exponentially weighted, a slow response moves the average in a few requests
+        self.latency = seconds if self.latency is None else self.latency * 0.8 + seconds * 0.2
+        endpoint_latency.labels(self.url).set(self.latency)
+
+    def fail(self, error):
+        if self.is_healthy():
+            logger.warning(f"RPC endpoint {self.url} failed: {error}, using other endpoints for {config['RPC_ENDPOINT_COOLDOWN_SECONDS']} seconds")
+        self.failed_at = time.time()
+        endpoint_healthy.labels(self.url).set(0)
+
+    def send(self, request) -> httpx.Response:
+        """Send request to this endpoint and read the whole response"""
+        routed = httpx.Request(request.method, self.url, content=request.content,
+                               headers=[(name, value) for name, value in request.headers.raw if name.lower() != b'host'],
+                               extensions=request.extensions)
+        start_time = time.time()
+        try:
+            response = self.transport.handle_request(routed)
+            response.read()
+        except Exception as e:
+            self.fail(e)
+            raise
+        if response.status_code == 429 or response.status_code >= 500:
+            self.fail(f"HTTP {response.status_code}")
+        else:
+            self.observe(time.time() - start_time)
+        return response
+
+
+class RoutingTransport(httpx.BaseTransport):
+    """Send JSON-RPC requests of one Client to several endpoints.
+
+    Reads go to the healthy endpoint with the lowest smoothed latency and are retried
+    on the next one if it fails. Endpoints are unhealthy for RPC_ENDPOINT_COOLDOWN_SECONDS
+    after an error and while their slot is more than RPC_MAX_SLOT_LAG behind the best one.
+    Methods from RPC_HEDGED_METHODS are sent to a second endpoint too if the first one
+    does not answer in RPC_HEDGE_DELAY_SECONDS, the first answer wins. Sticky methods
+    always go to the same endpoint while it is healthy."""
+
+    def __init__(self, urls, transport_factory):
+        self.endpoints = [Endpoint(url, transport_factory()) for url in urls]
+        self.hedged_methods = {method.strip() for method in config['RPC_HEDGED_METHODS'].split(',') if method.strip()}
+        self.sticky = self.endpoints[0]
+        self.executor = ThreadPoolExecutor(max_workers=int(config['RPC_POOL_MAX_CONNECTIONS']))
+        self.lock = threading.Lock()
+        self.health_thread = None
+
+    def get_calls(self, request) -> list:
+        try:
+            body = json.loads(request.content)
+        except ValueError:
+            return []
+        return body if isinstance(body, list) else [body]
+
+    def get_methods(self, request) -> set:
+        return {call.get('method') for call in self.get_calls(request)}
+
+    def get_block_slot(self, request):
+        """Return the highest slot requested with getBlock, None for other methods"""
+        slots = [call['params'][0] for call in self.get_calls(request)
+                 if call.get('method') == 'getBlock' and call.get('params')]
+        return max(slots) if slots else None
+
+    def ranked(self) -> list:
+        """Return endpoints from the best to the worst, unhealthy ones last"""
+        return sorted(self.endpoints, key=lambda endpoint: (not endpoint.is_healthy(),
+                                                            endpoint.lag,
+                                                            endpoint.latency if endpoint.latency is not None else 0))
+
+    def get_sticky(self) -> Endpoint:
+        with self.lock:
+            if not self.sticky.is_healthy():
+                best = self.ranked()[0]
+                if best is not self.sticky and best.is_healthy():
+                    logger.warning(f"Moving transactions from {self.sticky.url} to {best.url}")
+                    self.sticky = best
+            return self.sticky
+
+    def handle_request(self, request) -> httpx.Response:
+        self.start_health_checks()
+        methods = self.get_methods(request)
+        if methods & STICKY_METHODS:
+            return self.get_sticky().send(request)
+        endpoints = self.ranked()
+        if methods & self.hedged_methods and len(endpoints) > 1:
+            return self.hedge(request, endpoints)
+        for endpoint in endpoints[:-1]:
+            try:
+                response = endpoint.send(request)
+                if response.status_code != 429 and response.status_code < 500:
+                    return response
+            except httpx.TransportError:
+                pass
+        return endpoints[-1].send(request)
+
+    def hedge(self, request, endpoints) -> httpx.Response:
+        # a node behind the requested slot answers at once that the block is not available
+        slot = self.get_block_slot(request)
+        backups = [endpoint for endpoint in endpoints[1:]
+                   if endpoint.is_healthy() and (slot is None or (endpoint.slot is not None and endpoint.slot >= slot))]
+        if not backups:
+            return endpoints[0].send(request)
+        futures = [self.executor.submit(endpoints[0].send, request)]
+        done, _ = wait(futures, timeout=float(config['RPC_HEDGE_DELAY_SECONDS']))
+        if not done or not self.is_success(futures[0]):
+            futures.append(self.executor.submit(backups[0].send, request))
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if self.is_success(future):
+                    return future.result()
+        # both failed, report the error of the first endpoint
+        return futures[0].result()
+
+    def is_success(self, future) -> bool:
+        """HTTP 200 without a JSON-RPC error, in a batch every call must succeed"""
+        return (future.exception() is None and future.result().status_code == 200 and
+                ERROR_KEY.search(future.result().content) is None)
+
+    def start_health_checks(self):
+        with self.lock:
+            if self.health_thread is None:
+                self.health_thread = threading.Thread(daemon=True, name="RPC Health Checks", target=self.check_health)
+                self.health_thread.start()
+
+    def check_health(self):
+        """Poll getSlot of every endpoint and update their slot lag"""
+        body = json.dumps({"jsonrpc": "2.0", "id": 1, "method": "getSlot"}).encode()
+        while True:
+            for endpoint in self.endpoints:
+                try:
+                    request = httpx.Request("POST", endpoint.url, content=body,
+                                            headers={"Content-Type": "application/json"})
+                    endpoint.slot = int(json.loads(endpoint.send(request).content)["result"])
+                except Exception as e:
+                    endpoint.slot = None
+                    logger.warning(f"Health check of {endpoint.url} failed: {e}")
+            best_slot = max((endpoint.slot for endpoint in self.endpoints if endpoint.slot is not None), default=None)
+            for endpoint in self.endpoints:
+                if best_slot is not None and endpoint.slot is not None:
+                    endpoint.lag = best_slot - endpoint.slot
+                endpoint_slot_lag.labels(endpoint.url).set(endpoint.lag)
+                endpoint_healthy.labels(endpoint.url).set(int(endpoint.is_healthy()))
+            time.sleep(float(config['RPC_HEALTH_CHECK_SECONDS']))
+
+    def close(self):
+        for endpoint in self.endpoints:
+            endpoint.transport.close()
@@ -0,0 +1,17 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# the scanner thread runs in the API process, /metrics exports these from the default registry
+blocks_processed = Counter('solana_scanner_blocks_processed', 'Blocks checked by the block scanner')
+transactions_matched = Counter('solana_scanner_transactions_matched', 'Transactions of our accounts found by the block scanner')
+block_failures = Counter('solana_scanner_block_failures', 'Blocks which failed to download or check')
+block_retries = Counter('solana_scanner_block_retries', 'Blocks requested again after a failed batch request')
+scanner_restarts = Counter('solana_scanner_restarts', 'Block scanner restarts after an exception')
+blocks_in_flight = Gauge('solana_scanner_blocks_in_flight', 'Blocks being downloaded or checked by scanner threads')
+blocks_queued = Gauge('solana_scanner_blocks_queued', 'Blocks of the current chunk waiting for a scanner thread')
+block_seconds = Histogram('solana_scanner_block_seconds', 'Time to download and check one block',
+                          buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+chunk_seconds = Histogram('solana_scanner_chunk_seconds', 'Time to process one chunk of blocks of the scanner loop',
+                          buckets=(1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600))
+chunk_blocks = Histogram('solana_scanner_chunk_blocks', 'Blocks in one chunk of the scanner loop',
+                         buckets=(30, 100, 300, 1000, 3000, 10000))
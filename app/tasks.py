@@ -1,15 +1,17 @@
 import decimal
 import time
-import copy
 import requests
+from concurrent.futures import ThreadPoolExecutor
 
 from celery.utils.log import get_task_logger
+from sqlalchemy import case
 import requests as rq
 
-from . import celery
+from . import celery, balances, drains
 from .config import config
 from .models import Accounts, db
 from .coin import Coin, get_all_accounts
+from .keypairs import KeypairCache
 from .utils import skip_if_running
 
 logger = get_task_logger(__name__)
@@ -49,80 +51,139 @@ def post_payout_results(data, symbol):
 @celery.task(bind=True)
 @skip_if_running
 def refresh_balances(self):
-    updated = 0
-    refresh_inst = Coin("SOL")
-
+    """Split accounts into chunks and refresh them with refresh_balances_chunk tasks on all workers"""
+    list_acccounts = list(dict.fromkeys(get_all_accounts()))
+    chunk_size = int(config['REFRESH_CHUNK_SIZE'])
+    chunks = 0
+    for start in range(0, len(list_acccounts), chunk_size):
+        chunk = list_acccounts[start:start + chunk_size]
+        # DELAY_BETWEEN_ACC_BALANCE_REFRESH keeps its average rate by spreading the chunks in time
+        refresh_balances_chunk.apply_async((chunk,), countdown=start * config['DELAY_BETWEEN_ACC_BALANCE_REFRESH'])
+        chunks = chunks + 1
+    logger.warning(f"Scheduled balance refresh of {len(list_acccounts)} accounts in {chunks} chunks")
+    return chunks
+
+
+def update_balances(addresses, pairs=None) -> tuple:
+    """Fetch balances of Accounts rows of addresses concurrently and store them with one UPDATE per BALANCES_UPDATE_SIZE rows,
+    pairs limits the rows to these (symbol, address) pairs. Return balances by symbol and address and timings"""
+    start_time = time.time()
+    tokens = config['TOKENS'][config["CURRENT_SOL_NETWORK"]]
+    try:
+        rows = db.session.query(Accounts.id, Accounts.address, Accounts.crypto).filter(Accounts.address.in_(addresses)).all()
+        db.session.rollback()
+    except Exception:
+        db.session.rollback()
+        db.session.remove()
+        raise Exception("There was exception during query to the database, try again later")
+
+    if pairs is None:
+        # SOL balances of all addresses are needed to decide about drains
+        sol_owners = addresses
+    else:
+        rows = [row for row in rows if (row.crypto, row.address) in pairs]
+        sol_owners = [row.address for row in rows if row.crypto == "SOL"]
+    owners = {token: [row.address for row in rows if row.crypto == token] for token in tokens}
+    for token in tokens:
+        # token accounts are read from the database here, executor threads have no app context
+        Coin(token).get_associated_token_accounts(owners[token])
+
+    # SOL and every token are fetched at the same time, each of them in bulk
+    with ThreadPoolExecutor(max_workers=1 + len(tokens)) as executor:
+        futures = {"SOL": executor.submit(Coin("SOL").get_balances_multiple, sol_owners)}
+        for token in tokens:
+            futures[token] = executor.submit(Coin(token).get_token_balances_multiple, owners[token])
+        balances = {"SOL": dict(zip(sol_owners, futures["SOL"].result()))}
+        for token in tokens:
+            balances[token] = dict(zip(owners[token], futures[token].result()))
+    fetch_time = time.time()
+
+    updates = [{'id': row.id, 'amount': balances[row.crypto][row.address]}
+               for row in rows if row.address in balances.get(row.crypto, {})]
+    size = int(config['BALANCES_UPDATE_SIZE'])
     try:
-        from app import create_app
-        app = create_app()
-        app.app_context().push()
-
-        list_acccounts = get_all_accounts()
-        for account in list_acccounts:
-            try:
-                pd = Accounts.query.filter_by(address = account).first()
-            except Exception:
-                db.session.rollback()
-                raise Exception("There was exception during query to the database, try again later")
-
-            acc_balance = decimal.Decimal(refresh_inst.get_account_coin_balance(account))
-
-            if Accounts.query.filter_by(address = account, crypto = "SOL").first():
-                pd = Accounts.query.filter_by(address = account, crypto = "SOL").first()            
-                pd.amount = decimal.Decimal(acc_balance)                     
-                with app.app_context():
-                    db.session.add(pd)
-                    db.session.commit()
-                    db.session.close()
-            
-            have_tokens = False
-                
-            for token in config['TOKENS'][config["CURRENT_SOL_NETWORK"]]:
-                token_instance = Coin(token)
-                if Accounts.query.filter_by(address = account, crypto = token).first():
-                    pd = Accounts.query.filter_by(address = account, crypto = token).first()
-                    balance = token_instance.get_account_balance_from_fullnode(account)
-                    pd.amount = balance
-                    
-                    with app.app_context():
-                        db.session.add(pd)
-                        db.session.commit() 
-                        db.session.close()  
-                    if balance >= decimal.Decimal(config['MIN_TOKEN_TRANSFER_THRESHOLD']):
-                        have_tokens = copy.deepcopy(token)
-                    
-            if have_tokens in config['TOKENS'][config["CURRENT_SOL_NETWORK"]].keys():
-                drain_account.delay(have_tokens, account) 
-            else:
-                if acc_balance >= decimal.Decimal(config['MIN_TRANSFER_THRESHOLD']):
-                    drain_account.delay("SOL", account)        
-    
-            updated = updated + 1                
-    
-            with app.app_context():
-                db.session.add(pd)
-                db.session.commit()
-                db.session.close()
-            if config['DELAY_BETWEEN_ACC_BALANCE_REFRESH'] > 0:
-                time.sleep(config['DELAY_BETWEEN_ACC_BALANCE_REFRESH'])
+        # bulk_update_mappings is one UPDATE per row, a round trip each with PyMySQL
+        for i in range(0, len(updates), size):
+            chunk = updates[i:i + size]
+            amounts = case(*[(update['id'], update['amount']) for update in chunk], value=Accounts.id)
+            db.session.execute(Accounts.__table__.update()
+                                                 .where(Accounts.id.in_([update['id'] for update in chunk]))
+                                                 .values(amount=amounts))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise Exception("There was exception during update of the database, try again later")
     finally:
-        with app.app_context():
-            db.session.remove()
-            db.engine.dispose()  
- 
-    return updated
+        db.session.remove()
+    update_time = time.time()
+
+    return balances, {'accounts': len(addresses),
+                      'balances': len(updates),
+                      'fetch_seconds': fetch_time - start_time,
+                      'update_seconds': update_time - fetch_time}
+
+
+def schedule_drains(addresses, balances):
+    """Drain accounts with a refreshed balance at or above the threshold, tokens go before SOL"""
+    tokens = config['TOKENS'][config["CURRENT_SOL_NETWORK"]]
+    for account in addresses:
+        have_tokens = False
+        for token in tokens:
+            if (account in balances[token] and
+                balances[token][account] >= decimal.Decimal(config['MIN_TOKEN_TRANSFER_THRESHOLD'])):
+                have_tokens = token
+        if have_tokens:
+            drains.schedule_drain(have_tokens, account)
+        elif account in balances["SOL"] and balances["SOL"][account] >= decimal.Decimal(config['MIN_TRANSFER_THRESHOLD']):
+            drains.schedule_drain("SOL", account)
+
+
+@celery.task()
+def refresh_balances_chunk(addresses):
+    """Refresh balances of addresses and drain the accounts"""
+    balances, timings = update_balances(addresses)
+    schedule_drains(addresses, balances)
+    logger.warning(f"Refreshed {timings['balances']} balances of {len(addresses)} accounts: fetched for {timings['fetch_seconds']:.2f} "
+                   f"seconds, stored for {timings['update_seconds']:.2f} seconds")
+    return timings
 
 
 @celery.task(bind=True)
 @skip_if_running
+def refresh_dirty_balances(self):
+    """Refresh balances touched by transactions found by the scanner and drain the accounts,
+    a drain skipped while another one of the account was running is scheduled again here"""
+    pairs = balances.pop_dirty(int(config['DIRTY_BALANCES_MAX_SIZE']))
+    if not pairs:
+        return None
+    addresses = list(dict.fromkeys(address for _, address in pairs))
+    try:
+        refreshed, timings = update_balances(addresses, set(pairs))
+    except Exception:
+        # return the pairs, the next run tries them again
+        balances.mark_dirty(pairs)
+        raise
+    schedule_drains(addresses, refreshed)
+    logger.warning(f"Refreshed {timings['balances']} changed balances of {timings['accounts']} accounts: fetched for "
+                   f"{timings['fetch_seconds']:.2f} seconds, stored for {timings['update_seconds']:.2f} seconds")
+    return timings
+
+
+@celery.task(bind=True, before_start=drains.drain_started)
+@skip_if_running
 def drain_account(self, symbol, account):
+    drains.count("executed")
     logger.warning(f"Start draining from account {account} crypto {symbol}")
     inst = Coin(symbol)
     destination = inst.get_fee_deposit_account_address()
     if destination == account:
         logger.warning("Fee-deposit account, skip draining")
         return False
-    results = inst.drain_account(account, destination)
+    try:
+        results = inst.drain_account(account, destination)
+    finally:
+        # one-time accounts are drained once, the cache is left to the fee-deposit account
+        KeypairCache.evict(account)
     return results
 
 
@@ -139,5 +200,7 @@ def create_fee_deposit_account(self):
 def setup_periodic_tasks(sender, **kwargs):
     # Update cached account balances
     sender.add_periodic_task(int(config['UPDATE_TOKEN_BALANCES_EVERY_SECONDS']), refresh_balances.s())
+    # Update cached balances changed by transactions
+    sender.add_periodic_task(int(config['UPDATE_DIRTY_BALANCES_EVERY_SECONDS']), refresh_dirty_balances.s())
 
 
@@ -0,0 +1,66 @@
+import threading
+
+from solders.pubkey import Pubkey
+from sqlalchemy import select
+from spl.token.instructions import get_associated_token_address
+
+from .logging import logger
+from .models import TokenAccounts, db
+
+
+class AssociatedTokenAccounts:
+    """Associated token account addresses derived locally from owner, mint and token program.
+
+    Derived addresses are kept in memory and in the token_accounts table, so a new process
+    loads them with one query per chunk instead of deriving them again."""
+    addresses = {}
+    lock = threading.Lock()
+
+    @classmethod
+    def get(cls, owner, token) -> str:
+        return cls.get_many([owner], token)[0]
+
+    @classmethod
+    def get_many(cls, owners, token) -> list:
+        """Return ATA addresses of owners for the token from registry"""
+        with cls.lock:
+            missing = [owner for owner in dict.fromkeys(owners) if (owner, token.mint_address) not in cls.addresses]
+        if missing:
+            found = cls.load(missing, token)
+            derived = {owner: str(get_associated_token_address(Pubkey.from_string(owner), token.mint, token.program_id))
+                       for owner in missing if owner not in found}
+            if derived:
+                cls.save(derived, token)
+            with cls.lock:
+                for owner, address in list(found.items()) + list(derived.items()):
+                    cls.addresses[(owner, token.mint_address)] = address
+        with cls.lock:
+            return [cls.addresses[(owner, token.mint_address)] for owner in owners]
+
+    @classmethod
+    def load(cls, owners, token) -> dict:
+        # own connection, the caller's session and its pending changes are not touched
+        table = TokenAccounts.__table__
+        found = {}
+        try:
+            with db.engine.connect() as connection:
+                for start in range(0, len(owners), 1000):
+                    rows = connection.execute(select(table.c.owner, table.c.address)
+                                              .where(table.c.mint == token.mint_address,
+                                                     table.c.owner.in_(owners[start:start + 1000])))
+                    found.update({row.owner: row.address for row in rows})
+        except Exception as e:
+            # the table is only a cache, derive the addresses again
+            logger.warning(f"Cannot load token accounts: {e}")
+        return found
+
+    @classmethod
+    def save(cls, derived, token):
+        rows = [{'owner': owner, 'mint': token.mint_address, 'address': address} for owner, address in derived.items()]
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(TokenAccounts.__table__.insert()
+                                                          .prefix_with('IGNORE', dialect='mysql')
+                                                          .prefix_with('OR IGNORE', dialect='sqlite'), rows)
+        except Exception as e:
+            logger.warning(f"Cannot save token accounts: {e}")
@@ -0,0 +1,70 @@
+import threading
+from typing import NamedTuple, Optional
+
+from solders.pubkey import Pubkey
+from spl.token.constants import TOKEN_PROGRAM_ID, TOKEN_2022_PROGRAM_ID
+
+from .config import config
+
+
+TOKEN_PROGRAMS = {
+    'token': TOKEN_PROGRAM_ID,
+    'token-2022': TOKEN_2022_PROGRAM_ID,
+}
+
+
+class TokenInfo(NamedTuple):
+    symbol: str
+    mint_address: str
+    mint: Pubkey
+    program_id: Pubkey
+    decimals: Optional[int] # None if not configured, Coin.get_token_decimals reads it from the mint
+
+    @property
+    def is_token_2022(self) -> bool:
+        """Token-2022 mints need transfer_checked with mint and decimals"""
+        return self.program_id == TOKEN_2022_PROGRAM_ID
+
+
+class TokenRegistry:
+    """Tokens of CURRENT_SOL_NETWORK parsed once per process, indexed by symbol and by mint"""
+    by_symbol = None
+    by_mint = None
+    lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        with cls.lock:
+            if cls.by_symbol is not None:
+                return
+            by_symbol = {}
+            by_mint = {}
+            for symbol, token in config['TOKENS'][config['CURRENT_SOL_NETWORK']].items():
+                info = TokenInfo(symbol = symbol,
+                                 mint_address = token['token_address'],
+                                 mint = Pubkey.from_string(token['token_address']),
+                                 program_id = TOKEN_PROGRAMS[token.get('program', 'token')],
+                                 decimals = int(token['decimals']) if 'decimals' in token else None)
+                by_symbol[symbol] = info
+                by_mint[info.mint_address] = info
+                by_mint[bytes(info.mint)] = info
+            cls.by_mint = by_mint
+            cls.by_symbol = by_symbol
+
+    @classmethod
+    def get(cls, symbol) -> TokenInfo:
+        cls.load()
+        return cls.by_symbol[symbol]
+
+    @classmethod
+    def get_by_mint(cls, mint) -> Optional[TokenInfo]:
+        """Find token by base58 mint address, raw 32-byte key or Pubkey"""
+        cls.load()
+        if isinstance(mint, Pubkey):
+            mint = bytes(mint)
+        return cls.by_mint.get(mint)
+
+    @classmethod
+    def all(cls) -> list:
+        cls.load()
+        return list(cls.by_symbol.values())
@@ -0,0 +1,122 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import itertools
+
+from solana.rpc.websocket_api import connect
+from solders.pubkey import Pubkey
+from solders.rpc.config import RpcTransactionLogsFilterMentions
+from solders.rpc.responses import LogsNotification
+from spl.token.instructions import get_associated_token_address
+
+from .config import config
+from .logging import logger
+from .coin import Coin
+from .address_index import AddressIndex
+from .tokens import TokenRegistry
+from .events import get_token_symbols, handle_transaction, match_transaction
+
+
+def get_ws_url() -> str:
+    if config['FULLNODE_WS_URL']:
+        return config['FULLNODE_WS_URL']
+    return config['FULLNODE_URL'].replace('https://', 'wss://', 1).replace('http://', 'ws://', 1)
+
+
+def get_token_programs() -> list:
+    """Return (mint, token program id) of every configured token"""
+    return [(token.mint, token.program_id) for token in TokenRegistry.all()]
+
+
+def get_watched_pubkeys(keys, token_programs) -> list:
+    """Return our accounts and their associated token accounts,
+    token deposits mention only the token account and not its owner"""
+    pubkeys = []
+    for key in keys:
+        owner = Pubkey(key)
+        pubkeys.append(owner)
+        for mint, program_id in token_programs:
+            pubkeys.append(get_associated_token_address(owner, mint, program_id))
+    return pubkeys
+
+
+def check_signature(coin, signature, our_keys, token_symbols):
+    try:
+        transaction = coin.get_transaction(signature, commitment=config['EVENTS_WS_COMMITMENT'])
+    except Exception as e:
+        logger.warning(f"Cannot get notified transaction {signature}: {e}, leave it to the block scanner")
+        return
+    if transaction is None:
+        logger.warning(f"Cannot get notified transaction {signature}, leave it to the block scanner")
+        return
+    symbols, drains, touched = match_transaction(transaction.transaction, our_keys, token_symbols)
+    if symbols:
+        logger.warning(f"Found related transaction {signature} over websocket: {sorted(symbols)}")
+        handle_transaction(coin, str(signature), symbols, drains, touched)
+
+
+def report_failure(signature, future):
+    """Log an exception of a check_signature run, nobody waits for its result"""
+    if not future.cancelled() and future.exception() is not None:
+        logger.warning(f"Checking notified transaction {signature} failed: {future.exception()}")
+
+
+async def _ws_loop():
+    coin = Coin("SOL")
+    token_symbols = get_token_symbols()
+    token_programs = get_token_programs()
+    # every address is subscribed together with its token accounts
+    max_keys = int(config['EVENTS_WS_MAX_SUBSCRIPTIONS']) // (1 + len(token_programs))
+    loop = asyncio.get_running_loop()
+    # fetching and matching is blocking, the block scanner does the same work in threads
+    executor = ThreadPoolExecutor(max_workers=int(config['EVENTS_MAX_THREADS_NUMBER']))
+
+    try:
+        while True:
+            try:
+                async with connect(get_ws_url()) as websocket:
+                    subscribed = set()
+                    unsubscribed = 0
+                    logger.warning(f"Connected to {get_ws_url()}")
+                    while True:
+                        our_keys = AddressIndex.get_keys()
+                        new_keys = our_keys - subscribed
+                        room = max_keys - len(subscribed)
+                        if len(new_keys) > room:
+                            if len(new_keys) - room != unsubscribed:
+                                unsubscribed = len(new_keys) - room
+                                logger.warning(f"{unsubscribed} addresses are over EVENTS_WS_MAX_SUBSCRIPTIONS "
+                                               f"{config['EVENTS_WS_MAX_SUBSCRIPTIONS']}, only the block scanner detects their transactions")
+                            new_keys = set(itertools.islice(new_keys, room))
+                        for pubkey in get_watched_pubkeys(new_keys, token_programs):
+                            await websocket.logs_subscribe(RpcTransactionLogsFilterMentions(pubkey),
+                                                           commitment=config['EVENTS_WS_COMMITMENT'])
+                        subscribed |= new_keys
+                        try:
+                            while True:
+                                messages = await asyncio.wait_for(websocket.recv(),
+                                                                  timeout=int(config['EVENTS_WS_RESUBSCRIBE_SECONDS']))
+                                for message in messages:
+                                    if isinstance(message, LogsNotification):
+                                        signature = message.result.value.signature
+                                        future = loop.run_in_executor(executor, check_signature, coin,
+                                                                      signature, our_keys, token_symbols)
+                                        future.add_done_callback(functools.partial(report_failure, signature))
+                        except asyncio.TimeoutError:
+                            pass
+            except Exception as e:
+                sleep_sec = 10
+                logger.warning(f"Websocket listener failed: {e}, the block scanner covers the gap")
+                logger.warning(f"Waiting {sleep_sec} seconds before reconnect.")
+                await asyncio.sleep(sleep_sec)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def ws_listener():
+    """Detect our transactions with logsSubscribe notifications within a slot,
+    the block scanner keeps running and catches everything missed here"""
+    from app import create_app
+    app = create_app()
+    app.app_context().push()
+    asyncio.run(_ws_loop())
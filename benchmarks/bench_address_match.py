@@ -0,0 +1,50 @@
+"""Compare base58 string matching with raw key matching of block account keys.
+
+Run from the repository root:
+    python -m benchmarks.bench_address_match [transactions] [addresses]
+"""
+import sys
+import timeit
+
+from app.address_index import address_key
+from app.events import find_candidates
+from .synthetic import make_block, random_addresses
+
+
+def match_by_string(block, our_addresses) -> list:
+    """Matching as it was done before the raw key index"""
+    candidates = []
+    for transaction in block.transactions:
+        if (any(str(address) in our_addresses for address in transaction.transaction.message.account_keys) or
+            any(str(balance.owner) in our_addresses for balance in transaction.meta.post_token_balances)):
+            candidates.append(transaction)
+    return candidates
+
+
+def main():
+    transactions = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    addresses = int(sys.argv[2]) if len(sys.argv) > 2 else 100_000
+    our_addresses = random_addresses(addresses)
+    our_strings = set(our_addresses)
+    our_keys = {address_key(address) for address in our_addresses}
+    block = make_block(1, transactions=transactions, our_addresses=our_addresses[:100], hit_rate=0.01)
+
+    assert len(match_by_string(block, our_strings)) == len(find_candidates(block, our_keys))
+    number = 20
+    print(f"block with {transactions} transactions, {addresses} tracked addresses, "
+          f"{len(find_candidates(block, our_keys))} candidates")
+    # whole filter, including reading transactions out of the solders block
+    string_time = timeit.timeit(lambda: match_by_string(block, our_strings), number=number) / number
+    bytes_time = timeit.timeit(lambda: find_candidates(block, our_keys), number=number) / number
+    print(f"block filter   base58: {string_time * 1000:.2f} ms  raw keys: {bytes_time * 1000:.2f} ms  "
+          f"speedup: {string_time / bytes_time:.1f}x")
+    # key matching alone on already decoded account keys
+    keys = [transaction.transaction.message.account_keys for transaction in block.transactions]
+    string_time = timeit.timeit(lambda: [any(str(k) in our_strings for k in tx_keys) for tx_keys in keys], number=number) / number
+    bytes_time = timeit.timeit(lambda: [not our_keys.isdisjoint(map(bytes, tx_keys)) for tx_keys in keys], number=number) / number
+    print(f"key matching   base58: {string_time * 1000:.2f} ms  raw keys: {bytes_time * 1000:.2f} ms  "
+          f"speedup: {string_time / bytes_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Check how update_balances writes refreshed balances to the database.
+
+Accounts rows of ADDRESSES addresses are created in a temporary SQLite database
+and refreshed from the mock JSON-RPC server, which derives every balance from
+the address. Counts the statements sent to the database, an executemany counts
+once per row like PyMySQL sends it, and fails unless the rows are written with
+one UPDATE per BALANCES_UPDATE_SIZE rows and hold the fetched balances.
+
+Run from the repository root:
+    python -m benchmarks.bench_balances --addresses 2000
+"""
+import argparse
+import decimal
+import math
+import os
+import tempfile
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--addresses', type=int, default=2000, help='addresses with a SOL row and a row per token')
+    args = parser.parse_args()
+
+    from .mock_rpc import serve
+    from .synthetic import random_addresses
+
+    rpc = serve(1, 100)
+    database = os.path.join(tempfile.mkdtemp(), 'balances.db')
+    os.environ['FULLNODE_URL'] = f'http://127.0.0.1:{rpc.server_address[1]}'
+    os.environ['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{database}'
+    os.environ['BLOCK_CACHE_DIR'] = ''
+    from flask import Flask
+    from sqlalchemy import event
+    from app import tasks
+    from app.config import config
+    from app.models import Accounts, db
+
+    app = Flask(__name__)
+    app.config.from_mapping(config)
+    # the engine options are for MariaDB, SQLite gets the defaults
+    db._engine_options = {}
+    db.init_app(app)
+    app.app_context().push()
+    db.create_all()
+
+    tokens = list(config['TOKENS'][config['CURRENT_SOL_NETWORK']])
+    addresses = random_addresses(args.addresses, seed=1)
+    db.session.add_all([Accounts(address=address, crypto=crypto, amount=0)
+                        for address in addresses for crypto in ['SOL'] + tokens])
+    db.session.commit()
+
+    statements = []
+
+    @event.listens_for(db.engine, 'before_cursor_execute')
+    def count(connection, cursor, statement, parameters, context, executemany):
+        statements.extend([statement.split()[0]] * (len(parameters) if executemany else 1))
+
+    start_time = time.time()
+    balances, timings = tasks.update_balances(addresses)
+    print(f"{timings['balances']} balances: fetched for {timings['fetch_seconds']:.2f} s, "
+          f"written for {timings['update_seconds']:.2f} s, {time.time() - start_time:.2f} s in total")
+    updates = statements.count('UPDATE')
+    expected = math.ceil(timings['balances'] / int(config['BALANCES_UPDATE_SIZE']))
+    print(f"{len(statements)} statements, {updates} of them UPDATE, {expected} expected")
+    if updates != expected:
+        raise Exception(f"{updates} UPDATE statements for {timings['balances']} rows, expected {expected}")
+    for row in db.session.query(Accounts).all():
+        # SQLite keeps numerics as floats
+        if abs(row.amount - balances[row.crypto][row.address]) > decimal.Decimal('1e-12'):
+            raise Exception(f"{row.crypto} balance of {row.address} is {row.amount}, fetched {balances[row.crypto][row.address]}")
+    print("stored balances match the fetched ones")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Check the RPC router against several local mock JSON-RPC servers.
+
+The primary endpoint has every block but answers slowly, the secondary one is fast
+and lags LAG slots behind, so it answers blocks it does not have yet with -32004.
+Every scenario runs in a fresh process with its own configuration and reports
+the time of a getBlock the lagging endpoint has and of one it does not have.
+
+Run from the repository root:
+    python -m benchmarks.bench_router --delay 1.5 --lag 10
+"""
+import argparse
+import multiprocessing
+import os
+import time
+
+
+FIRST_SLOT = 1_000_000
+
+
+def run_client(urls, hedged_methods, slots, connection):
+    os.environ['FULLNODE_URLS'] = ','.join(urls)
+    os.environ['RPC_HEDGED_METHODS'] = hedged_methods
+    os.environ['BLOCK_CACHE_DIR'] = ''
+    from app.coin import Coin
+
+    coin = Coin("SOL")
+    coin.get_slot()
+    transport = coin.client._provider.session._transport
+    # the router is wrapped by the adaptive limiter if it is enabled
+    transport = getattr(transport, 'transport', transport)
+    # the first health check gives every endpoint its slot
+    while any(endpoint.slot is None for endpoint in transport.endpoints):
+        time.sleep(0.1)
+    results = []
+    for slot in slots:
+        start_time = time.time()
+        try:
+            coin.get_block(slot)
+            results.append((slot, time.time() - start_time, 'ok'))
+        except Exception as e:
+            results.append((slot, time.time() - start_time, type(e).__name__))
+    connection.send(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--delay', type=float, default=1.5, help='seconds the primary endpoint takes to answer')
+    parser.add_argument('--lag', type=int, default=10, help='slots the secondary endpoint is behind')
+    args = parser.parse_args()
+
+    from .mock_rpc import serve
+    last_slot = FIRST_SLOT + 100
+    primary = serve(FIRST_SLOT, last_slot, delay=args.delay)
+    secondary = serve(FIRST_SLOT, last_slot - args.lag)
+    urls = [f'http://127.0.0.1:{server.server_address[1]}' for server in (primary, secondary)]
+    # render the pools before any request is timed
+    for server in (primary, secondary):
+        for details in ('full', 'accounts'):
+            server.get_block_json(FIRST_SLOT, details)
+    # a block both endpoints have and one only the primary has
+    slots = [last_slot - args.lag - 5, last_slot - args.lag // 2]
+
+    context = multiprocessing.get_context('spawn')
+    print(f"{'hedged methods':<16}{'slot':>10}{'seconds':>10}  result")
+    for hedged_methods in ('getBlock', ''):
+        receiver, sender = context.Pipe(duplex=False)
+        process = context.Process(target=run_client, args=(urls, hedged_methods, slots, sender))
+        process.start()
+        for slot, seconds, result in receiver.recv():
+            print(f"{hedged_methods or '-':<16}{slot:>10}{seconds:>10.2f}  {result}")
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
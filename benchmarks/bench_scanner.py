@@ -0,0 +1,142 @@
+"""Measure block scanner throughput against a local mock JSON-RPC server.
+
+Every configuration scans the same slot range in a fresh process and reports
+blocks/s, CPU time of the scanner process and its peak RSS. The mock server runs
+in its own process, so its work is not counted.
+
+Run from the repository root:
+    python -m benchmarks.bench_scanner --blocks 300 --threads 10,30 --addresses 1000,100000 \\
+        --modes threads,batch,async --details full,accounts
+"""
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import multiprocessing
+import resource
+import time
+
+
+FIRST_SLOT = 1_000_000
+
+
+def run_server(first_slot, last_slot, transactions, connection):
+    from .mock_rpc import MockRpcServer
+    server = MockRpcServer(('127.0.0.1', 0), first_slot, last_slot, transactions=transactions)
+    # render the pools before any scanner is timed
+    for details in ('full', 'accounts'):
+        server.get_block_json(first_slot, details)
+    connection.send(server.server_address[1])
+    server.serve_forever()
+
+
+def scan(mode, blocks, threads, our_keys):
+    from app.config import config
+    from app.coin import Coin
+    from app.events import check_batch_in_parallel, check_in_parallel, scan_blocks
+
+    coin = Coin("SOL")
+    token_symbols = {}
+    if mode == 'threads':
+        scan_blocks(blocks, lambda block: check_in_parallel(coin, block, our_keys, token_symbols), threads, lambda block: None)
+    elif mode == 'batch':
+        size = int(config['EVENTS_BLOCKS_PER_REQUEST'])
+        batches = [blocks[i:i + size] for i in range(0, len(blocks), size)]
+        scan_blocks(batches, lambda batch: check_batch_in_parallel(coin, batch, our_keys, token_symbols), threads,
+                    lambda batch: None)
+    elif mode == 'async':
+        asyncio.run(scan_async(coin, blocks, threads, our_keys, token_symbols))
+    else:
+        raise Exception(f"Unknown mode {mode}")
+
+
+async def scan_async(coin, blocks, concurrency, our_keys, token_symbols):
+    from solders.rpc.requests import GetBlock
+    from solders.rpc.responses import GetBlockResp
+    from app.async_events import get_async_client, scan_blocks_async
+    from app.events import check_block
+
+    client = get_async_client(concurrency)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=10)
+
+    async def fetch(block):
+        body = GetBlock(int(block), coin.get_block_config())
+        return (await client._provider.make_request(body, GetBlockResp)).value
+
+    async def process(block, buf):
+        await loop.run_in_executor(executor, check_block, coin, block, buf, our_keys, token_symbols)
+
+    try:
+        await scan_blocks_async(blocks, fetch, process, concurrency, lambda block: None)
+    finally:
+        executor.shutdown()
+        await client.close()
+
+
+def run_scanner(port, mode, details, threads, addresses, blocks_count, blocks_per_request, connection):
+    """Scan blocks_count slots in this process and send back its measurements"""
+    from app.config import config
+    from app.address_index import address_key
+    from .synthetic import random_addresses
+
+    config['FULLNODE_URL'] = f'http://127.0.0.1:{port}'
+    config['EVENTS_BLOCK_DETAILS'] = details
+    config['EVENTS_BLOCKS_PER_REQUEST'] = blocks_per_request
+    config['RPC_BATCH_MAX_SIZE'] = blocks_per_request
+    config['BLOCK_CACHE_DIR'] = ''
+    # blocks carry no transactions of these addresses, so notifications and drains are not measured
+    our_keys = {address_key(address) for address in random_addresses(addresses, seed=1)}
+    blocks = list(range(FIRST_SLOT + 1, FIRST_SLOT + 1 + blocks_count))
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start_time = time.perf_counter()
+    scan(mode, blocks, threads, our_keys)
+    elapsed = time.perf_counter() - start_time
+    end_usage = resource.getrusage(resource.RUSAGE_SELF)
+    connection.send({
+        'blocks_per_second': blocks_count / elapsed,
+        'cpu_seconds': (end_usage.ru_utime - usage.ru_utime) + (end_usage.ru_stime - usage.ru_stime),
+        'peak_rss_mb': end_usage.ru_maxrss / 1024,
+    })
+
+
+def in_process(target, *args):
+    """Run target in a fresh process and return what it sends through the last argument"""
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=target, args=args + (sender,), daemon=True)
+    process.start()
+    return process, receiver
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocks', type=int, default=200, help='slots scanned by every configuration')
+    parser.add_argument('--transactions', type=int, default=1500, help='transactions in a block')
+    parser.add_argument('--threads', default='10', help='comma separated scanner threads or async concurrency')
+    parser.add_argument('--addresses', default='1000', help='comma separated numbers of tracked addresses')
+    parser.add_argument('--modes', default='threads', help='comma separated modes: threads, batch, async')
+    parser.add_argument('--details', default='full', help='comma separated getBlock modes: full, accounts')
+    parser.add_argument('--blocks-per-request', type=int, default=5, help='blocks in one batch request of batch mode')
+    args = parser.parse_args()
+
+    server, receiver = in_process(run_server, FIRST_SLOT, FIRST_SLOT + args.blocks, args.transactions)
+    port = receiver.recv()
+    print(f"{args.blocks} blocks of {args.transactions} transactions")
+    print(f"{'mode':8} {'details':9} {'threads':>7} {'addresses':>9} {'blocks/s':>9} {'cpu s':>7} {'peak MB':>8}")
+    try:
+        for mode, details, threads, addresses in itertools.product(args.modes.split(','), args.details.split(','),
+                                                                   args.threads.split(','), args.addresses.split(',')):
+            scanner, receiver = in_process(run_scanner, port, mode, details, int(threads), int(addresses),
+                                           args.blocks, args.blocks_per_request)
+            result = receiver.recv()
+            scanner.join()
+            print(f"{mode:8} {details:9} {threads:>7} {addresses:>9} {result['blocks_per_second']:9.1f} "
+                  f"{result['cpu_seconds']:7.1f} {result['peak_rss_mb']:8.0f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Check the websocket listener against a local stub websocket and mock JSON-RPC server.
+
+The listener subscribes our addresses with logsSubscribe, the stub pushes a
+notification for a deposit to one of them and the mock serves the transaction.
+Reports the time from the push to the drain of the account, then checks that a
+deposit whose drain cannot be scheduled still gets its SHKeeper notification
+queued and that an unexpected failure while checking a notification is logged. Our addresses are given
+to the address index directly and drains are recorded instead of scheduled, so
+neither the database nor Redis is needed.
+
+Run from the repository root:
+    python -m benchmarks.bench_ws --addresses 100 --notifications 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import queue
+import random
+import statistics
+import threading
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--addresses', type=int, default=100, help='our addresses subscribed by the listener')
+    parser.add_argument('--notifications', type=int, default=20, help='deposits pushed one after another')
+    args = parser.parse_args()
+
+    from .mock_rpc import serve
+    from .mock_ws import MockWsServer
+    from .synthetic import make_transaction_json, random_addresses
+
+    rpc = serve(1, 100)
+    ws = MockWsServer().start()
+    os.environ['FULLNODE_URL'] = f'http://127.0.0.1:{rpc.server_address[1]}'
+    os.environ['FULLNODE_WS_URL'] = ws.url
+    os.environ['EVENTS_WS_RESUBSCRIBE_SECONDS'] = '1'
+    os.environ['BLOCK_CACHE_DIR'] = ''
+    from app import events, ws_events
+    from app.address_index import AddressIndex
+    from app.logging import logger
+    from app.tokens import TokenRegistry
+
+    addresses = random_addresses(args.addresses, seed=1)
+    AddressIndex.refresh = classmethod(lambda cls: None)
+    for address in addresses:
+        AddressIndex.add(address)
+    drained = {}
+    failing = set()
+    broken = set()
+
+    def record_drain(symbol, address):
+        if address in failing:
+            raise Exception("broker is down")
+        drained[address] = time.time()
+
+    def mark_dirty(pairs):
+        if any(address in broken for symbol, address in pairs):
+            raise Exception("unexpected failure")
+
+    events.schedule_drain = record_drain
+    events.mark_dirty = mark_dirty
+
+    threading.Thread(target=asyncio.run, args=(ws_events._ws_loop(),), daemon=True, name="WS Push Listener").start()
+    # every address and its token accounts are subscribed
+    subscriptions = args.addresses * (1 + len(TokenRegistry.all()))
+    while len(ws.subscriptions) < subscriptions:
+        time.sleep(0.1)
+    print(f"{len(ws.subscriptions)} subscriptions")
+
+    rng = random.Random(2)
+    latencies = []
+    for slot in range(1, args.notifications + 1):
+        address = rng.choice(addresses)
+        drained.pop(address, None)
+        transaction = make_transaction_json(rng, 10, [address], hit_rate=1, token_share=0, mints=())
+        rpc.add_transaction(transaction, slot)
+        start_time = time.time()
+        ws.notify(transaction['transaction']['signatures'][0], [address], slot)
+        while address not in drained:
+            if time.time() - start_time > 10:
+                raise Exception(f"Deposit to {address} was not detected")
+            time.sleep(0.001)
+        latencies.append(drained[address] - start_time)
+    print(f"push to drain: median {statistics.median(latencies) * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms")
+
+    warnings = []
+    handler = logging.Handler()
+    handler.emit = lambda record: warnings.append(record.getMessage())
+    logger.addHandler(handler)
+
+    def wait_for_warning(signature, text):
+        start_time = time.time()
+        while not any(signature in warning and text in warning for warning in warnings):
+            if time.time() - start_time > 10:
+                raise Exception(f"No warning with {text!r} about {signature}")
+            time.sleep(0.01)
+
+    def push(address, slot):
+        transaction = make_transaction_json(rng, 10, [address], hit_rate=1, token_share=0, mints=())
+        signature = transaction['transaction']['signatures'][0]
+        rpc.add_transaction(transaction, slot)
+        ws.notify(signature, [address], slot)
+        return signature
+
+    # the transaction is not handled twice, so its notification must not depend on the drain
+    while True:
+        try:
+            events.outbox.pending.get_nowait()
+        except queue.Empty:
+            break
+    failing.add(addresses[0])
+    signature = push(addresses[0], args.notifications + 1)
+    wait_for_warning(signature, "Cannot schedule drain")
+    queued = []
+    while True:
+        try:
+            queued.append(events.outbox.pending.get_nowait())
+        except queue.Empty:
+            break
+    if ('SOL', signature) not in queued:
+        raise Exception(f"Notification about {signature} was not queued after the failed drain")
+    print("failed drain leaves a queued notification")
+
+    # nobody waits for the check of a notified transaction, its failure must be logged
+    broken.add(addresses[1])
+    signature = push(addresses[1], args.notifications + 2)
+    wait_for_warning(signature, "failed")
+    print("failed check is logged")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Local JSON-RPC server answering the requests of the block scanner with synthetic blocks"""
+import base64
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+
+from .synthetic import make_block_json
+
+
+class MockRpcServer(ThreadingHTTPServer):
+    """Serve getSlot, getBlocks, getBlock, getTransaction, getMultipleAccounts and getAccountInfo
+    of token mints, also in batches.
+
+    A pool of distinct blocks is generated once per transactionDetails mode and
+    rendered to JSON in advance, slot N gets block N % pool_size, so serving costs
+    next to nothing compared to the scanner. Blocks after last_slot are not available
+    like on a lagging node, and every answer can be delayed by delay seconds."""
+    daemon_threads = True
+
+    def __init__(self, address, first_slot, last_slot, pool_size=20, delay=0, **block_kwargs):
+        super().__init__(address, MockRpcHandler)
+        self.first_slot = first_slot
+        self.last_slot = last_slot
+        self.pool_size = pool_size
+        self.delay = delay
+        # signature: getTransaction result, see add_transaction
+        self.transactions = {}
+        self.block_kwargs = block_kwargs
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def get_block_json(self, slot, details) -> str:
+        with self.lock:
+            if details not in self.pools:
+                self.pools[details] = [json.dumps(make_block_json(self.first_slot + i, details=details, **self.block_kwargs))
+                                       for i in range(self.pool_size)]
+        return self.pools[details][slot % self.pool_size]
+
+    def add_transaction(self, transaction, slot):
+        """Serve transaction made by synthetic.make_transaction_json with getTransaction"""
+        result = dict(transaction, slot=slot, blockTime=1_700_000_000 + slot // 2)
+        self.transactions[transaction['transaction']['signatures'][0]] = json.dumps(result)
+
+    def answer(self, request) -> str:
+        request_id = json.dumps(request.get('id'))
+        method = request.get('method')
+        params = request.get('params') or []
+        if method == 'getSlot':
+            result = str(self.last_slot)
+        elif method == 'getBlocks':
+            end = min(int(params[1]) if len(params) > 1 and isinstance(params[1], int) else self.last_slot, self.last_slot)
+            result = json.dumps(list(range(max(int(params[0]), self.first_slot), end + 1)))
+        elif method == 'getBlock' and int(params[0]) > self.last_slot:
+            return (f'{{"jsonrpc":"2.0","id":{request_id},"error":{{"code":-32004,'
+                    f'"message":"Block not available for slot {int(params[0])}"}}}}')
+        elif method == 'getBlock':
+            block_config = params[1] if len(params) > 1 else {}
+            result = self.get_block_json(int(params[0]), block_config.get('transactionDetails') or 'full')
+        elif method == 'getTransaction':
+            result = self.transactions.get(params[0], 'null')
+        elif method == 'getMultipleAccounts':
+            # lamports and the token amount are derived from the address, so results can be checked
+            data_slice = (params[1] if len(params) > 1 else {}).get('dataSlice') or {'offset': 0, 'length': 165}
+            accounts = []
+            for address in params[0]:
+                value = sum(address.encode()) * 1000
+                data = bytes(64) + value.to_bytes(8, 'little') + bytes(93)
+                data = data[data_slice['offset']:data_slice['offset'] + data_slice['length']]
+                accounts.append({"data": [base64.b64encode(data).decode(), "base64"], "executable": False, "lamports": value,
+                                 "owner": "11111111111111111111111111111111", "rentEpoch": 0, "space": 165})
+            result = json.dumps({"context": {"slot": self.last_slot}, "value": accounts})
+        elif method == 'getAccountInfo':
+            # only token mints are asked for, with jsonParsed encoding
+            result = json.dumps({"context": {"slot": self.last_slot}, "value": {
+                "data": {"parsed": {"info": {"decimals": 6, "freezeAuthority": None, "isInitialized": True,
+                                             "mintAuthority": None, "supply": "0"}, "type": "mint"},
+                         "program": "spl-token", "space": 82},
+                "executable": False, "lamports": 1461600, "owner": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA",
+                "rentEpoch": 0, "space": 82}})
+        else:
+            return f'{{"jsonrpc":"2.0","id":{request_id},"error":{{"code":-32601,"message":"Method not found"}}}}'
+        return f'{{"jsonrpc":"2.0","id":{request_id},"result":{result}}}'
+
+
+class MockRpcHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        if isinstance(body, list):
+            data = '[' + ','.join(self.server.answer(request) for request in body) + ']'
+        else:
+            data = self.server.answer(body)
+        data = data.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve(first_slot, last_slot, port=0, **kwargs) -> MockRpcServer:
+    """Start the server in a background thread, port 0 picks a free one"""
+    server = MockRpcServer(('127.0.0.1', port), first_slot, last_slot, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True, name="Mock RPC").start()
+    return server
@@ -0,0 +1,66 @@
+"""Local stub of the RPC websocket answering logsSubscribe and pushing logsNotification"""
+import asyncio
+import itertools
+import json
+import threading
+
+from websockets.asyncio.server import serve
+
+
+class MockWsServer:
+    """Accept logsSubscribe with a mentions filter, notify(signature, addresses) pushes
+    a notification to every subscription mentioning one of the addresses."""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.ids = itertools.count(1)
+        self.loop = asyncio.new_event_loop()
+        self.port = None
+
+    def start(self) -> 'MockWsServer':
+        """Serve in a background thread, a free port is picked"""
+        ready = threading.Event()
+
+        async def run():
+            async with serve(self.handle, '127.0.0.1', 0) as server:
+                self.port = server.sockets[0].getsockname()[1]
+                ready.set()
+                await asyncio.Future()
+
+        threading.Thread(target=self.loop.run_until_complete, args=(run(),), daemon=True, name="Mock WS").start()
+        ready.wait()
+        return self
+
+    @property
+    def url(self) -> str:
+        return f'ws://127.0.0.1:{self.port}'
+
+    async def handle(self, websocket):
+        try:
+            async for message in websocket:
+                request = json.loads(message)
+                if request.get('method') != 'logsSubscribe':
+                    await websocket.send(json.dumps({"jsonrpc": "2.0", "id": request.get('id'),
+                                                     "error": {"code": -32601, "message": "Method not found"}}))
+                    continue
+                subscription = next(self.ids)
+                self.subscriptions[subscription] = (websocket, request['params'][0]['mentions'][0])
+                await websocket.send(json.dumps({"jsonrpc": "2.0", "id": request['id'], "result": subscription}))
+        finally:
+            for subscription, (subscriber, _) in list(self.subscriptions.items()):
+                if subscriber is websocket:
+                    del self.subscriptions[subscription]
+
+    def notify(self, signature, addresses, slot=1):
+        asyncio.run_coroutine_threadsafe(self.push(signature, set(addresses), slot), self.loop).result()
+
+    async def push(self, signature, addresses, slot):
+        for subscription, (websocket, mentioned) in list(self.subscriptions.items()):
+            if mentioned in addresses:
+                await websocket.send(json.dumps({
+                    "jsonrpc": "2.0",
+                    "method": "logsNotification",
+                    "params": {"subscription": subscription,
+                               "result": {"context": {"slot": slot},
+                                          "value": {"signature": signature, "err": None, "logs": []}}},
+                }))
@@ -0,0 +1,124 @@
+"""Synthetic getBlock results for the scanner benchmarks"""
+import json
+import random
+
+from solders.hash import Hash
+from solders.pubkey import Pubkey
+from solders.signature import Signature
+from solders.transaction_status import UiConfirmedBlock
+
+
+SYSTEM_PROGRAM = "11111111111111111111111111111111"
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+
+
+def random_address(rng) -> str:
+    return str(Pubkey(rng.randbytes(32)))
+
+
+def random_addresses(count, seed=0) -> list:
+    rng = random.Random(seed)
+    return [random_address(rng) for _ in range(count)]
+
+
+def make_transaction_json(rng, keys_per_transaction, our_addresses, hit_rate, token_share, mints, details='full') -> dict:
+    keys = [random_address(rng) for _ in range(keys_per_transaction - 1)] + [SYSTEM_PROGRAM]
+    pre_balances = [rng.randrange(10**8, 10**10) for _ in keys]
+    post_balances = list(pre_balances)
+    post_balances[0] -= 5000
+    if our_addresses and rng.random() < hit_rate:
+        keys[1] = rng.choice(our_addresses)
+        post_balances[1] += 10**7
+        post_balances[0] -= 10**7
+    pre_token_balances = []
+    post_token_balances = []
+    if rng.random() < token_share:
+        keys[-1] = TOKEN_PROGRAM
+        owner = random_address(rng)
+        if our_addresses and rng.random() < hit_rate:
+            owner = rng.choice(our_addresses)
+        mint = rng.choice(mints) if mints else random_address(rng)
+        for account_index, (balance_owner, amount) in enumerate(((random_address(rng), 10**9), (owner, 0)), start=2):
+            pre_token_balances.append({
+                "accountIndex": account_index,
+                "mint": mint,
+                "owner": balance_owner,
+                "programId": TOKEN_PROGRAM,
+                "uiTokenAmount": {"amount": str(amount), "decimals": 6, "uiAmount": amount / 10**6, "uiAmountString": str(amount / 10**6)},
+            })
+        post_token_balances = json.loads(json.dumps(pre_token_balances))
+        for balance, amount in zip(post_token_balances, (10**9 - 10**6, 10**6)):
+            balance["uiTokenAmount"] = {"amount": str(amount), "decimals": 6, "uiAmount": amount / 10**6, "uiAmountString": str(amount / 10**6)}
+    signatures = [str(Signature(rng.randbytes(64)))]
+    # separate generator for the parts of full transactions, so both forms carry the same balances
+    filler = random.Random(rng.getrandbits(64))
+    meta = {
+        "err": None,
+        "fee": 5000,
+        "preBalances": pre_balances,
+        "postBalances": post_balances,
+        "preTokenBalances": pre_token_balances,
+        "postTokenBalances": post_token_balances,
+        "status": {"Ok": None},
+    }
+    if details == 'accounts':
+        # transactionDetails "accounts" replaces the message with the list of accounts
+        # and limits meta to fee, err and balances
+        transaction = {
+            "accountKeys": [{"pubkey": key, "signer": i == 0, "writable": i < 2, "source": "transaction"}
+                            for i, key in enumerate(keys)],
+            "signatures": signatures,
+        }
+    else:
+        program = keys[-1]
+        transaction = {
+            "message": {
+                "accountKeys": keys,
+                "header": {"numReadonlySignedAccounts": 0, "numReadonlyUnsignedAccounts": 1, "numRequiredSignatures": 1},
+                "instructions": [{"accounts": list(range(len(keys) - 1)), "data": str(Hash(filler.randbytes(32))),
+                                  "programIdIndex": len(keys) - 1, "stackHeight": None}
+                                 for _ in range(3)],
+                "recentBlockhash": str(Hash(filler.randbytes(32))),
+            },
+            "signatures": signatures,
+        }
+        meta.update({
+            "innerInstructions": [{"index": 0, "instructions": [
+                {"accounts": [0, 1], "data": str(Hash(filler.randbytes(32))), "programIdIndex": len(keys) - 1, "stackHeight": 2}
+                for _ in range(4)]}],
+            "logMessages": [f"Program {program} invoke [1]",
+                            f"Program log: Instruction: Transfer",
+                            f"Program {program} consumed {filler.randrange(1000, 200000)} of 200000 compute units",
+                            f"Program {program} success"] * 3,
+            "loadedAddresses": {"readonly": [], "writable": []},
+            "rewards": [],
+            "computeUnitsConsumed": filler.randrange(1000, 200000),
+        })
+    return {
+        "meta": meta,
+        "transaction": transaction,
+        "version": 0,
+    }
+
+
+def make_block_json(slot, transactions=1500, keys_per_transaction=10, our_addresses=(),
+                    hit_rate=0.001, token_share=0.3, mints=(), seed=None, details='full') -> dict:
+    """Return getBlock result of json encoding with roughly mainnet density,
+    details='accounts' gives the transactionDetails "accounts" form"""
+    rng = random.Random(slot if seed is None else seed)
+    our_addresses = list(our_addresses)
+    return {
+        "blockHeight": slot,
+        "blockTime": 1_700_000_000 + slot // 2,
+        "blockhash": str(Hash(rng.randbytes(32))),
+        "parentSlot": slot - 1,
+        "previousBlockhash": str(Hash(rng.randbytes(32))),
+        "rewards": [] if details == 'accounts' else [{"commission": None, "lamports": 5000, "postBalance": 10**9,
+                                                       "pubkey": random_address(rng), "rewardType": "Fee"}],
+        "transactions": [make_transaction_json(rng, keys_per_transaction, our_addresses, hit_rate, token_share, mints, details)
+                         for _ in range(transactions)],
+    }
+
+
+def make_block(slot, **kwargs) -> UiConfirmedBlock:
+    return UiConfirmedBlock.from_json(json.dumps(make_block_json(slot, **kwargs)))
@@ -9,6 +9,13 @@ events_listener_thread = threading.Thread(
 )
 events_listener_thread.start()
 
+notifications_dispatcher_thread = threading.Thread(
+    daemon=True,
+    name="Notifications Dispatcher",
+    target=app.outbox.notifications_dispatcher,
+)
+notifications_dispatcher_thread.start()
+
 server = app.create_app()
 
 if __name__ == '__main__':